@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+from multiprocessing import Pool
+import utils
+from solver import solve, input_size
+from student_utils import cost_of_solution
+from instance import Instance
+from instance_cache import parse_input
+
+# Instance sets bundled with the repo, by the name used on the command line
+INSTANCE_SETS = {
+    'inputs': 'inputs',
+    'phase1': 'phase1/inputs',
+    'harder': 'test-inputs/incubated-harder-inputs',
+    'multiple-visits': 'test-inputs/requires-multiple-visits',
+}
+
+
+def select_instances(sets, size=None, limit=None):
+    """
+    (set name, input file) of every instance of the given sets, in a fixed order. With size only
+    instances with that many locations are kept, with limit only the first limit of each set.
+    """
+    instances = []
+    for instance_set in sets:
+        input_files = sorted(utils.get_files_with_extension(INSTANCE_SETS[instance_set], '.in'))
+        if size is not None:
+            input_files = [input_file for input_file in input_files if input_size(input_file) == size]
+        instances += [(instance_set, input_file) for input_file in input_files[:limit]]
+    return instances
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_instance(task):
+    """
+    Solves one instance and returns its result record. Runs in a fresh process, so that the peak
+    memory (ru_maxrss, in kilobytes) is that of this instance alone.
+    """
+    instance_set, input_file, params = task
+    # the solver and CBC log to stdout, which would drown the progress lines
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    record = {'set': instance_set, 'input_file': input_file, 'params': params, 'error': None}
+    try:
+        phase_start = time.perf_counter()
+        num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix, roads = parse_input(input_file)
+        parse_time = time.perf_counter() - phase_start
+        record['size'] = num_of_locations
+
+        stats = {}
+        sol = solve(list_locations, list_houses, starting_car_location, adjacency_matrix, params=params, stats=stats)
+        record['times'] = dict(parse=parse_time, **stats.get('times', {}))
+        if sol:
+            car_path, drop_offs, is_optimal = sol
+            instance = Instance(list_locations, list_houses, starting_car_location, adjacency_matrix)
+            cost, message = cost_of_solution(instance, car_path, drop_offs)
+            record['cost'] = None if cost == 'infinite' else cost
+            record['bound'] = stats.get('bound')
+            record['gap'] = None if record['cost'] is None or record['bound'] is None or record['cost'] == 0 else (record['cost'] - record['bound']) / record['cost']
+            record['optimal'] = is_optimal
+            if record['cost'] is None:
+                record['error'] = message
+        else:
+            record['error'] = 'no feasible solution'
+    except Exception as e:
+        record['error'] = repr(e)
+    record['peak_memory_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return record
+
+
+def run(results_file, instances, params=[], jobs=1):
+    """
+    Benchmarks instances with the given solver params and writes one JSON record per line to results_file.
+    """
+    commit = current_commit()
+    tasks = [(instance_set, input_file, params) for instance_set, input_file in instances]
+    records = []
+    with open(results_file, 'w', encoding='utf-8') as f, Pool(jobs, maxtasksperchild=1) as pool:
+        for record in pool.imap(benchmark_instance, tasks):
+            record['commit'] = commit
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            records.append(record)
+            total_time = sum(record.get('times', {}).values())
+            print(record['input_file'], record.get('cost'), record.get('gap'), f'{total_time:.2f}s', record['error'] or '', file=sys.stderr)
+
+    solved = [record for record in records if record['error'] is None]
+    gaps = [record['gap'] for record in solved if record['gap'] is not None]
+    print(f'{len(solved)} of {len(records)} solved, {sum(record["optimal"] for record in solved)} optimal', file=sys.stderr)
+    if gaps:
+        print(f'mean gap {sum(gaps) / len(gaps):.4%}', file=sys.stderr)
+    return records
+
+
+def load_results(results_file):
+    with open(results_file, 'r', encoding='utf-8') as f:
+        return {record['input_file']: record for record in map(json.loads, f) if record}
+
+
+def diff(old_file, new_file, cost_tolerance=1e-6, time_tolerance=0.25, memory_tolerance=0.25):
+    """
+    Compares two result files instance by instance and prints every regression: failures, higher
+    costs, lost optimality, and total times or peak memory that grew by more than the tolerance.
+    Returns the number of regressions.
+    """
+    old, new = load_results(old_file), load_results(new_file)
+    regressions = 0
+    for input_file in sorted(old.keys() & new.keys()):
+        a, b = old[input_file], new[input_file]
+        problems = []
+        if b['error'] is not None:
+            if a['error'] is None:
+                problems.append(f"fails: {b['error']}")
+        elif a['error'] is None:
+            if b['cost'] > a['cost'] + cost_tolerance * max(1, abs(a['cost'])):
+                problems.append(f"cost {a['cost']} -> {b['cost']}")
+            if a['optimal'] and not b['optimal']:
+                problems.append('no longer optimal')
+            old_time, new_time = sum(a['times'].values()), sum(b['times'].values())
+            if new_time > old_time * (1 + time_tolerance) and new_time - old_time > 1:
+                problems.append(f'time {old_time:.2f}s -> {new_time:.2f}s')
+        if b['peak_memory_kb'] > a['peak_memory_kb'] * (1 + memory_tolerance):
+            problems.append(f"peak memory {a['peak_memory_kb']} -> {b['peak_memory_kb']} kB")
+        if problems:
+            regressions += 1
+            print(input_file, '; '.join(problems))
+
+    for input_file in sorted(old.keys() - new.keys()):
+        print(input_file, 'missing from', new_file)
+    print(regressions, 'of', len(old.keys() & new.keys()), 'instances regressed')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Benchmark the solver and write the results')
+    run_parser.add_argument('results_file', type=str, help='The JSON lines file to write the results to')
+    run_parser.add_argument('--sets', nargs='+', choices=sorted(INSTANCE_SETS), default=['inputs'], help='The instance sets to run')
+    run_parser.add_argument('--size', type=int, default=None, help='Only run instances with this many locations')
+    run_parser.add_argument('--limit', type=int, default=None, help='Only run the first instances of each set')
+    run_parser.add_argument('--jobs', type=int, default=1, help='Number of instances to solve in parallel')
+    run_parser.add_argument('--params', nargs='+', default=[], help='Extra arguments passed to the solver, such as mode=heuristic or time=60')
+
+    diff_parser = subparsers.add_parser('diff', help='Compare two result files and report regressions')
+    diff_parser.add_argument('old_results', type=str, help='The results to compare against')
+    diff_parser.add_argument('new_results', type=str, help='The results to check')
+    diff_parser.add_argument('--cost-tolerance', type=float, default=1e-6, help='Relative cost increase that is not a regression')
+    diff_parser.add_argument('--time-tolerance', type=float, default=0.25, help='Relative time increase that is not a regression')
+    diff_parser.add_argument('--memory-tolerance', type=float, default=0.25, help='Relative peak memory increase that is not a regression')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.results_file, select_instances(args.sets, args.size, args.limit), params=args.params, jobs=args.jobs)
+    else:
+        sys.exit(1 if diff(args.old_results, args.new_results, args.cost_tolerance, args.time_tolerance, args.memory_tolerance) else 0)
@@ -0,0 +1,453 @@
+import os
+import time
+import gzip
+import hashlib
+import numpy as np
+import networkx as nx
+from mip import Model, OptimizationStatus, LinExpr, xsum, minimize, BINARY, INTEGER, CBC
+
+from shortest_paths import fewest_marked_nodes_on_path
+from heuristic import solution_cost
+
+
+def graph_arcs(weights):
+    """
+    Directed arcs (i, j) of a dense weight array, both directions of every road.
+    """
+    n = len(weights)
+    return [(int(i), int(j)) for i, j in np.argwhere(np.isfinite(weights) & ~np.eye(n, dtype=bool))]
+
+
+def candidate_stops(distances, home_indices, starting_car_index):
+    """
+    For each TA, the stops where dropping them off can be optimal. The start is always on the route,
+    so a stop that is no closer to the TA's home than the start is never better than the start.
+    """
+    return [
+        [starting_car_index] + [int(stop) for stop in np.flatnonzero(distances[home] < distances[home, starting_car_index])]
+        for home in home_indices
+    ]
+
+
+# Relative slack added to the cutoff of optimize()
+CUTOFF_TOLERANCE = 1e-6
+
+
+# Bump when write_lp changes, so that cached model files of older versions are not used
+MODEL_FILE_VERSION = 2
+
+
+def model_key(weights, distances, home_indices, starting_car_index, formulation):
+    """
+    Hash of everything a RouteModel is built from, to name its cached model file.
+    """
+    key = hashlib.sha256(f'{MODEL_FILE_VERSION} {formulation} {starting_car_index} {list(home_indices)}'.encode('utf-8'))
+    key.update(np.ascontiguousarray(weights, dtype=float).tobytes())
+    key.update(np.ascontiguousarray(distances, dtype=float).tobytes())
+    return key.hexdigest()
+
+
+class RouteModel:
+    """
+    MIP over the arcs of the graph. Variables only exist for arcs that are roads and for the
+    candidate stops of each TA.
+        edge_taken[(i, j)]: the car drives from i to j
+        drop_ta_at_stop[ta][stop]: TA ta gets off at stop
+        flow_over_edge[(i, j)]: number of TAs in the car while it drives from i to j (SCF)
+        ta_over_edge[(i, j)][ta]: TA ta is in the car while it drives from i to j (MCF)
+    The 'cuts' formulation has no flow variables. Connectivity of the route is instead enforced by cut
+    constraints that are only added once a solution violates them, see optimize().
+    With model_file (a .lp.gz path) the model is read from that file, which is first written from the
+    arrays by write_lp if it does not exist yet, instead of being built term by term.
+    solver_name is the python-mip solver to build the model for, CBC or GUROBI.
+    """
+
+    def __init__(self, weights, distances, home_indices, starting_car_index, stops=None, formulation='scf', model_file=None, solver_name=CBC):
+        self.weights = weights
+        self.distances = distances
+        self.home_indices = home_indices
+        self.starting_car_index = starting_car_index
+        self.arcs = graph_arcs(weights)
+        self.stops = stops if stops is not None else candidate_stops(distances, home_indices, starting_car_index)
+        self.formulation = formulation
+        self.model = Model(solver_name=solver_name)
+        self.progress = []
+        self.incumbent, self.bound = None, None
+
+        L = range(len(weights))
+        tas = range(len(home_indices))
+        nTas = len(tas)
+        model = self.model
+        start = starting_car_index
+
+        arcs_into = {i: [] for i in L}
+        arcs_out_of = {i: [] for i in L}
+        for i, j in self.arcs:
+            arcs_out_of[i].append((i, j))
+            arcs_into[j].append((i, j))
+        tas_at_stop = {i: [] for i in L}
+        for ta in tas:
+            for stop in self.stops[ta]:
+                tas_at_stop[stop].append(ta)
+        self.arcs_into, self.arcs_out_of, self.tas_at_stop = arcs_into, arcs_out_of, tas_at_stop
+
+        if formulation not in ('scf', 'mcf', 'cuts'):
+            raise ValueError(f'Unknown formulation {formulation}.')
+        if model_file is not None:
+            if not os.path.exists(model_file):
+                self.write_lp(model_file)
+            self.read(model_file)
+            return
+
+        variables = {name: model.add_var(name=name, var_type=var_type) for name, var_type in self.variables()}
+        objective = self.objective_terms()
+        model.objective = minimize(LinExpr([variables[name] for _, name in objective], [coefficient for coefficient, _ in objective]))
+        for terms, sense, rhs in self.constraints():
+            # python-mip reads a constraint as expression + const compared to 0
+            model.add_constr(LinExpr([variables[name] for _, name in terms], [coefficient for coefficient, _ in terms], -rhs, '=' if sense == '=' else '>'))
+        self.find_vars(model.vars)
+
+    def variables(self):
+        """
+        Name and type of every variable of the formulation: x_i_j (edge_taken), y_ta_stop (drop_ta_at_stop),
+        f_i_j (flow_over_edge) and z_i_j_ta (ta_over_edge).
+        """
+        names = [(f'x_{i}_{j}', BINARY) for i, j in self.arcs]
+        names += [(f'y_{ta}_{stop}', BINARY) for ta, stops in enumerate(self.stops) for stop in stops]
+        if self.formulation == 'mcf':
+            names += [(f'z_{i}_{j}_{ta}', BINARY) for i, j in self.arcs for ta in range(len(self.home_indices))]
+        elif self.formulation == 'scf':
+            names += [(f'f_{i}_{j}', INTEGER) for i, j in self.arcs]
+        return names
+
+    def objective_terms(self):
+        """
+        (coefficient, variable name) of every term of the objective, driving plus walking cost.
+        """
+        terms = [((2 / 3) * float(self.weights[i, j]), f'x_{i}_{j}') for i, j in self.arcs]
+        terms += [(float(self.distances[self.home_indices[ta], stop]), f'y_{ta}_{stop}') for ta, stops in enumerate(self.stops) for stop in stops]
+        return terms
+
+    def constraints(self):
+        """
+        Every constraint of the formulation as (terms, sense, rhs), with terms a list of (coefficient,
+        variable name) and sense '=' or '>='. Both __init__ and write_lp build the model from these.
+        """
+        return [(terms, sense, rhs) for terms, sense, rhs in self.constraint_rows() if terms]
+
+    def constraint_rows(self):
+        """
+        The rows of constraints(), including those left without terms when a location has no arcs.
+        """
+        L = range(len(self.weights))
+        tas = range(len(self.home_indices))
+        nTas = len(tas)
+        start = self.starting_car_index
+        x = {(i, j): f'x_{i}_{j}' for i, j in self.arcs}
+        y = [{stop: f'y_{ta}_{stop}' for stop in self.stops[ta]} for ta in tas]
+
+        # enter city same number of times as we exist the city
+        for i in L:
+            yield [(1, x[arc]) for arc in self.arcs_into[i]] + [(-1, x[arc]) for arc in self.arcs_out_of[i]], '=', 0
+
+        # every TA is dropped off at exactly one stop
+        for ta in tas:
+            yield [(1, name) for name in y[ta].values()], '=', 1
+
+        if self.formulation == 'mcf':
+            z = {(i, j): [f'z_{i}_{j}_{ta}' for ta in tas] for i, j in self.arcs}
+
+            # each TA gets dropped off at their stop
+            for node in L:
+                if node == start:
+                    continue
+                for ta in tas:
+                    dropped = [(-1, y[ta][node])] if node in y[ta] else []
+                    yield [(1, z[arc][ta]) for arc in self.arcs_into[node]] + [(-1, z[arc][ta]) for arc in self.arcs_out_of[node]] + dropped, '=', 0
+
+            # each TA must be dropped off somewhere along the route, right before we leave if at the start
+            for ta in tas:
+                yield [(1, z[arc][ta]) for arc in self.arcs_out_of[start]] + [(1, y[ta][start])], '=', 1
+                yield [(1, z[arc][ta]) for arc in self.arcs_into[start]], '=', 0
+
+            # if a TA goes over an edge, we must take it as well
+            for arc in self.arcs:
+                for ta in tas:
+                    yield [(1, x[arc]), (-1, z[arc][ta])], '>=', 0
+        elif self.formulation == 'scf':
+            f = {(i, j): f'f_{i}_{j}' for i, j in self.arcs}
+
+            # flow decreases only when TAs are dropped off
+            for node in L:
+                if node == start:
+                    continue
+                dropped = [(-1, y[ta][node]) for ta in self.tas_at_stop[node]]
+                yield [(1, f[arc]) for arc in self.arcs_into[node]] + [(-1, f[arc]) for arc in self.arcs_out_of[node]] + dropped, '=', 0
+
+            # each TA must be dropped off somewhere along the route
+            yield [(1, f[arc]) for arc in self.arcs_out_of[start]] + [(1, y[ta][start]) for ta in tas], '=', nTas
+            yield [(1, f[arc]) for arc in self.arcs_into[start]], '=', 0
+
+            # if flow goes over an edge, we must take it as well
+            # the car has passed at least homes_on_path[i] homes by the time it reaches i
+            homes_on_path = fewest_marked_nodes_on_path(self.weights, start, self.home_indices)
+            for i, j in self.arcs:
+                yield [(float(nTas - homes_on_path[i]), x[i, j]), (-1, f[i, j])], '>=', 0
+        else:
+            # the car reaches every stop that a TA gets dropped off at
+            for node in L:
+                if node == start:
+                    continue
+                for ta in self.tas_at_stop[node]:
+                    yield [(1, x[arc]) for arc in self.arcs_into[node]] + [(-1, y[ta][node])], '>=', 0
+
+            # the car leaves the start unless every TA gets off there
+            for ta in tas:
+                yield [(1, x[arc]) for arc in self.arcs_out_of[start]] + [(1, y[ta][start])], '>=', 1
+
+    def write_lp(self, model_file):
+        """
+        Writes the model that __init__ builds to model_file, in gzipped LP format, from the same
+        variables(), objective_terms() and constraints(). Coefficients keep full precision, which the LP
+        and MPS writers of CBC round off.
+        """
+        def term(coefficient, name):
+            if coefficient in (1, -1):
+                return f'{"+" if coefficient > 0 else "-"} {name}'
+            return f'{"+" if coefficient > 0 else "-"} {abs(float(coefficient))!r} {name}'
+
+        def wrapped(terms):
+            # CBC's LP reader cannot take arbitrarily long lines
+            terms = [term(coefficient, name) for coefficient, name in terms]
+            return '\n  '.join(' '.join(terms[k:k + 10]) for k in range(0, len(terms), 10))
+
+        rows = [f' c{k}: {wrapped(terms)} {sense} {rhs!r}' for k, (terms, sense, rhs) in enumerate(self.constraints())]
+        variables = self.variables()
+        integers = [name for name, var_type in variables if var_type == INTEGER]
+        binaries = [name for name, var_type in variables if var_type == BINARY]
+        lines = ['Minimize', ' obj: ' + wrapped(self.objective_terms()), 'Subject To'] + rows
+        lines += ['Generals'] + [' ' + name for name in integers] if integers else []
+        lines += ['Binaries'] + [' ' + name for name in binaries] + ['End', '']
+        temporary_file = f'{model_file}.{os.getpid()}.tmp'
+        with gzip.open(temporary_file, 'wt', encoding='utf-8', compresslevel=1) as file:
+            file.write('\n'.join(lines))
+        os.replace(temporary_file, model_file)
+
+    def read(self, model_file):
+        """
+        Reads a model written by write_lp and finds its variables by name.
+        """
+        self.model.read(model_file)
+        self.find_vars(self.model.vars)
+
+    def find_vars(self, variables):
+        """
+        Sets edge_taken, drop_ta_at_stop and flow_over_edge or ta_over_edge from the names of variables.
+        """
+        self.edge_taken = {}
+        self.drop_ta_at_stop = [{} for ta in self.home_indices]
+        if self.formulation == 'scf':
+            self.flow_over_edge = {}
+        elif self.formulation == 'mcf':
+            self.ta_over_edge = {arc: {} for arc in self.arcs}
+        for var in variables:
+            kind, *indices = var.name.split('_')
+            indices = tuple(int(index) for index in indices)
+            if kind == 'x':
+                self.edge_taken[indices] = var
+            elif kind == 'y':
+                self.drop_ta_at_stop[indices[0]][indices[1]] = var
+            elif kind == 'f':
+                self.flow_over_edge[indices] = var
+            else:
+                self.ta_over_edge[indices[:2]][indices[2]] = var
+
+    def solve_relaxation(self, max_seconds):
+        """
+        Solves the LP relaxation within max_seconds. With the 'cuts' formulation, the violated cuts are
+        added and the relaxation is solved again until it has none left. Returns the objective value of
+        the last relaxation solved to optimality, which is a lower bound on the cost of every
+        solution, or None if there is none.
+        """
+        start_time = time.time()
+        bound = None
+        while time.time() < start_time + max_seconds:
+            if self.model.optimize(relax=True) != OptimizationStatus.OPTIMAL:
+                break
+            bound = self.model.objective_value
+            self.progress.append((time.time() - start_time, bound, None))
+            cuts = self.violated_cuts() if self.formulation == 'cuts' else []
+            if not cuts:
+                break
+            for cut in cuts:
+                self.model += cut
+        return bound
+
+    def optimize(self, max_seconds, slice_seconds=None, on_solution=None, cutoff=None):
+        """
+        Solves the model within max_seconds. With the 'cuts' formulation, the LP relaxation gets its
+        violated cuts first, then while the solution leaves a used stop disconnected from the start,
+        the violated cuts are added and the model is solved again.
+        With slice_seconds the time is split into solves of slice_seconds, twice as long each time,
+        each warm started from the best solution so far, and on_solution(path, dropoffs, bound) is
+        called with every better solution as soon as its solve ends.
+        The best solution and the highest lower bound of all solves are kept as incumbent and bound.
+        cutoff is optionally called before every solve for the objective value of the best solution
+        known elsewhere, so that the solve can prune everything that is more expensive. If that leaves
+        nothing, bound is raised to that objective value, which proves the solution optimal.
+        Returns the status of the last solve, or NO_SOLUTION_FOUND if time ran out on a disconnected one.
+        Every solve appends (seconds since the start, lower bound, objective value or None) to progress.
+        """
+        start_time = time.time()
+        deadline = start_time + max_seconds
+        self.incumbent, self.bound = None, None
+        if self.formulation == 'cuts':
+            self.raise_bound(self.solve_relaxation(max_seconds))
+
+        best_cost = None
+        seconds = slice_seconds or max_seconds
+        while True:
+            known = cutoff() if cutoff is not None else np.inf
+            if np.isfinite(known):
+                # a little slack, so that a solution as cheap as the known one is still found
+                self.model.cutoff = known + CUTOFF_TOLERANCE * max(1, abs(known))
+            status = self.solve_until(min(deadline, time.time() + seconds), start_time)
+            if status == OptimizationStatus.INFEASIBLE and np.isfinite(known):
+                # nothing beats the cutoff, so the solution known elsewhere is optimal
+                self.raise_bound(known)
+            if self.model.num_solutions > 0:
+                # solution() makes a valid route of a disconnected one too, if time ran out on it
+                solution = self.solution()
+                cost = solution_cost(self.weights, self.distances, *solution)
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    self.incumbent = solution
+                    if on_solution is not None:
+                        on_solution(*self.incumbent, self.bound)
+            if slice_seconds is None or status not in (OptimizationStatus.FEASIBLE, OptimizationStatus.NO_SOLUTION_FOUND) or time.time() >= deadline:
+                return status
+            if self.incumbent is not None:
+                self.model.start = self.start_values(*self.incumbent)
+            seconds *= 2
+
+    def raise_bound(self, bound):
+        if bound is not None and np.isfinite(bound) and (self.bound is None or bound > self.bound):
+            self.bound = bound
+
+    def solve_until(self, deadline, start_time):
+        """
+        One solve of optimize(), up to deadline, with the 'cuts' formulation repeated while it has violated cuts.
+        Every solve raises bound to its lower bound, which for the 'cuts' formulation is the objective value
+        once it is solved to optimality, even with cuts still missing.
+        """
+        while True:
+            status = self.model.optimize(max_seconds=max(0, deadline - time.time()))
+            self.progress.append((time.time() - start_time, self.model.objective_bound, self.model.objective_value if self.model.num_solutions > 0 else None))
+            if status == OptimizationStatus.OPTIMAL:
+                self.raise_bound(self.model.objective_value)
+            elif status in (OptimizationStatus.FEASIBLE, OptimizationStatus.NO_SOLUTION_FOUND):
+                self.raise_bound(self.model.objective_bound)
+            if self.formulation != 'cuts' or self.model.num_solutions == 0:
+                return status
+            cuts = self.violated_cuts()
+            if not cuts:
+                return status
+            if time.time() >= deadline:
+                return OptimizationStatus.NO_SOLUTION_FOUND
+            for cut in cuts:
+                self.model += cut
+
+    def violated_cuts(self, tolerance=1e-4):
+        """
+        Cut constraints of the 'cuts' formulation that the model's current solution violates. For a set S
+        of locations without the start and a stop v in S, the car has to enter S if it uses v:
+            sum of edge_taken over arcs into S >= edge_taken[(v, w)] and >= drop_ta_at_stop[ta][v]
+        Violated cuts are found with a minimum cut from the start to every used stop, over the arcs
+        weighted by their current (possibly fractional) values.
+        """
+        start = self.starting_car_index
+        support = nx.DiGraph()
+        support.add_node(start)
+        usage = {}
+        for (i, j), var in self.edge_taken.items():
+            if var.x > tolerance:
+                support.add_edge(i, j, capacity=var.x)
+                if var.x > usage.get(i, (0, None))[0]:
+                    usage[i] = (var.x, var)
+        for stops in self.drop_ta_at_stop:
+            for stop, var in stops.items():
+                if stop != start and var.x > usage.get(stop, (0, None))[0]:
+                    usage[stop] = (var.x, var)
+                    support.add_node(stop)
+        usage.pop(start, None)
+
+        cuts = []
+        separated = set()
+        for stop, (used, var) in sorted(usage.items(), key=lambda item: -item[1][0]):
+            if stop in separated:
+                continue
+            cut_value, (reachable, cut_side) = nx.minimum_cut(support, start, stop)
+            if cut_value >= used - tolerance:
+                continue
+            entering = [self.edge_taken[arc] for arc in self.arcs if arc[0] not in cut_side and arc[1] in cut_side]
+            cuts.append(xsum(entering) >= var)
+            separated |= cut_side
+        return cuts
+
+    def start_values(self, path, dropoffs):
+        """
+        Variable values of a known solution (car path and dropoffs in terms of indices), for model.start.
+        TAs dropped off at a stop that is not one of their candidates are moved to the start, which is
+        never worse. Arc and flow values are left out if the path uses an arc more than once, as the arc
+        variables are binary.
+        """
+        drop_stop = {}
+        for stop, homes in dropoffs.items():
+            for home in homes:
+                drop_stop[home] = stop
+        stop_of_ta = [
+            drop_stop[home] if drop_stop.get(home) in self.drop_ta_at_stop[ta] else self.starting_car_index
+            for ta, home in enumerate(self.home_indices)
+        ]
+        values = [(self.drop_ta_at_stop[ta][stop], 1) for ta, stop in enumerate(stop_of_ta)]
+
+        arcs = list(zip(path[:-1], path[1:]))
+        if len(set(arcs)) != len(arcs) or any(arc not in self.edge_taken for arc in arcs):
+            return values
+        values += [(self.edge_taken[arc], 1) for arc in arcs]
+
+        # TAs ride along until the car first reaches their stop
+        in_car = set(ta for ta, stop in enumerate(stop_of_ta) if stop != self.starting_car_index)
+        for arc in arcs:
+            if self.formulation == 'scf':
+                values.append((self.flow_over_edge[arc], len(in_car)))
+            elif self.formulation == 'mcf':
+                values += [(self.ta_over_edge[arc][ta], 1) for ta in in_car]
+            in_car -= set(ta for ta in in_car if stop_of_ta[ta] == arc[1])
+        return values
+
+    def solution(self):
+        """
+        Car path and dropoffs of the model's current solution, in the format solve() returns them.
+        Only the taken arcs connected to the start make up the path, as the flow formulations allow cycles
+        that carry no flow anywhere else. A TA dropped off at a stop off the path walks from its closest
+        stop on the path instead.
+        """
+        edge_graph = nx.DiGraph()
+        for (i, j), var in self.edge_taken.items():
+            if var.x >= 0.99:
+                edge_graph.add_edge(i, j)
+
+        if self.starting_car_index not in edge_graph:
+            path = [self.starting_car_index]
+        else:
+            component = nx.node_connected_component(edge_graph.to_undirected(as_view=True), self.starting_car_index)
+            path = [u for u, v in nx.eulerian_circuit(edge_graph.subgraph(component), source=self.starting_car_index)] + [self.starting_car_index]
+
+        dropoffs = {}
+        for ta, home in enumerate(self.home_indices):
+            drop_off_stop = [stop for stop, var in self.drop_ta_at_stop[ta].items() if var.x >= 0.99][0]
+            if drop_off_stop not in path:
+                drop_off_stop = min(path, key=lambda stop: self.distances[home, stop])
+            dropoffs.setdefault(drop_off_stop, []).append(home)
+        return path, dropoffs
@@ -0,0 +1,236 @@
+import numpy as np
+
+from shortest_paths import reconstruct_path
+
+# Smallest relative change in cost that counts as an improvement
+EPSILON = 1e-9
+
+
+"""
+A route is a list of distinct stops that starts with the starting location. The car drives between
+consecutive stops along shortest paths and returns from the last stop to the start, so every route
+is a tour over the metric closure of the graph.
+"""
+
+def improvement_threshold(distances):
+    """
+    Costs are sums of up to 2e9-sized floats, so rounding noise grows with the largest distance.
+    """
+    return -EPSILON * max(1.0, float(distances.max()))
+
+
+def route_driving_cost(distances, route):
+    tour = route + [route[0]]
+    return (2 / 3) * float(distances[tour[:-1], tour[1:]].sum())
+
+
+def route_walking_cost(distances, home_indices, route):
+    return float(distances[np.ix_(home_indices, route)].min(axis=1).sum())
+
+
+def route_cost(distances, home_indices, route):
+    return route_driving_cost(distances, route) + route_walking_cost(distances, home_indices, route)
+
+
+def solution_cost(weights, distances, path, dropoffs):
+    """
+    Total cost of a car path in the original graph and its dropoffs, both in terms of indices.
+    """
+    driving = (2 / 3) * float(weights[path[:-1], path[1:]].sum())
+    walking = sum(float(distances[stop, homes].sum()) for stop, homes in dropoffs.items())
+    return driving + walking
+
+
+def nearest_neighbor_route(distances, stops, starting_car_index):
+    route = [starting_car_index]
+    remaining = set(stops) - {starting_car_index}
+    while remaining:
+        candidates = list(remaining)
+        nearest = candidates[int(np.argmin(distances[route[-1], candidates]))]
+        route.append(nearest)
+        remaining.remove(nearest)
+    return route
+
+
+def two_opt(distances, route):
+    """
+    Reverses route segments while that shortens the tour. The start stays first.
+    """
+    route = list(route)
+    threshold = improvement_threshold(distances)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 2):
+            tour = np.array(route + [route[0]])
+            a, b = tour[i], tour[i + 1]
+            c, d = tour[i + 2:-1], tour[i + 3:]
+            delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < threshold:
+                j = i + 2 + best
+                route[i + 1:j + 1] = route[i + 1:j + 1][::-1]
+                improved = True
+    return route
+
+
+def or_opt(distances, route, max_segment_length=3):
+    """
+    Moves segments of up to max_segment_length consecutive stops to a cheaper place in the tour,
+    possibly reversed, while that shortens the tour.
+    """
+    route = list(route)
+    threshold = improvement_threshold(distances)
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, max_segment_length + 1):
+            for i in range(1, len(route) - length + 1):
+                tour = route + [route[0]]
+                segment = route[i:i + length]
+                previous, following = tour[i - 1], tour[i + length]
+                removal = distances[previous, following] - distances[previous, segment[0]] - distances[segment[-1], following]
+
+                rest = route[:i] + route[i + length:]
+                rest_tour = np.array(rest + [rest[0]])
+                u, v = rest_tour[:-1], rest_tour[1:]
+                forward = distances[u, segment[0]] + distances[segment[-1], v] - distances[u, v]
+                backward = distances[u, segment[-1]] + distances[segment[0], v] - distances[u, v]
+                best = int(np.argmin(np.minimum(forward, backward)))
+                delta = removal + min(forward[best], backward[best])
+                if delta < threshold:
+                    if backward[best] < forward[best]:
+                        segment = segment[::-1]
+                    route = rest[:best + 1] + segment + rest[best + 1:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return route
+
+
+def remove_stops(distances, home_indices, route):
+    """
+    Removes the stop whose removal saves the most while any removal lowers the total cost.
+    """
+    route = list(route)
+    threshold = improvement_threshold(distances)
+    while len(route) > 1:
+        tour = np.array(route + [route[0]])
+        walking = distances[np.ix_(home_indices, route)]
+        closest = walking.argmin(axis=1)
+        ordered = np.sort(walking, axis=1)
+        walking_delta = np.bincount(closest, weights=ordered[:, 1] - ordered[:, 0], minlength=len(route))
+
+        previous, current, following = tour[:-2], tour[1:-1], tour[2:]
+        driving_delta = np.zeros(len(route))
+        driving_delta[1:] = distances[previous, following] - distances[previous, current] - distances[current, following]
+
+        delta = (2 / 3) * driving_delta + walking_delta
+        delta[0] = np.inf
+        best = int(np.argmin(delta))
+        if delta[best] >= threshold:
+            break
+        del route[best]
+    return route
+
+
+def insert_stops(distances, home_indices, route):
+    """
+    Inserts the location that saves the most at its cheapest place in the tour, while any insertion
+    lowers the total cost.
+    """
+    route = list(route)
+    threshold = improvement_threshold(distances)
+    while True:
+        tour = np.array(route + [route[0]])
+        u, v = tour[:-1], tour[1:]
+        insertion = distances[u] + distances[v] - distances[u, v][:, None]
+        positions = insertion.argmin(axis=0)
+        driving_delta = insertion[positions, np.arange(len(distances))]
+
+        walking = distances[np.ix_(home_indices, route)].min(axis=1)
+        walking_delta = np.minimum(walking[:, None], distances[home_indices]).sum(axis=0) - walking.sum()
+
+        delta = (2 / 3) * driving_delta + walking_delta
+        delta[route] = np.inf
+        best = int(np.argmin(delta))
+        if delta[best] >= threshold:
+            break
+        route.insert(int(positions[best]) + 1, best)
+    return route
+
+
+def improve_route(distances, home_indices, route):
+    """
+    Applies 2-opt, Or-opt, stop removal and stop insertion until none of them lowers the total cost.
+    """
+    threshold = improvement_threshold(distances)
+    cost = route_cost(distances, home_indices, route)
+    while True:
+        route = two_opt(distances, route)
+        route = or_opt(distances, route)
+        route = remove_stops(distances, home_indices, route)
+        route = insert_stops(distances, home_indices, route)
+        new_cost = route_cost(distances, home_indices, route)
+        if new_cost - cost >= threshold:
+            return route
+        cost = new_cost
+
+
+def assign_dropoffs(distances, home_indices, route):
+    """
+    Drops every TA off at the stop of the route closest to their home.
+    """
+    closest = np.array(route)[distances[np.ix_(home_indices, route)].argmin(axis=1)]
+    dropoffs = {}
+    for home, stop in zip(home_indices, closest):
+        dropoffs.setdefault(int(stop), []).append(home)
+    return dropoffs
+
+
+def route_to_path(predecessors, route):
+    """
+    Expands a route into a closed walk in the original graph.
+    """
+    if len(route) == 1:
+        return list(route)
+    tour = route + [route[0]]
+    path = [route[0]]
+    for u, v in zip(tour[:-1], tour[1:]):
+        path += reconstruct_path(predecessors, u, v)[1:]
+    return path
+
+
+def route_from_path(distances, home_indices, path):
+    """
+    Route over the locations of a car path that are the closest one on it to some TA's home, in the
+    order the path first reaches them. Dropping every TA off at the closest location on the path and
+    driving between these stops along shortest paths never costs more than the path did.
+    """
+    locations = list(dict.fromkeys(path))
+    used = set(np.array(locations)[distances[np.ix_(home_indices, locations)].argmin(axis=1)].tolist())
+    return [locations[0]] + [location for location in locations[1:] if location in used]
+
+
+def improve_solution(distances, predecessors, home_indices, path):
+    """
+    Local search from a known car path: improves the route of route_from_path with improve_route and
+    returns the car path and dropoffs in the format of solve().
+    """
+    route = improve_route(distances, home_indices, route_from_path(distances, home_indices, path))
+    return route_to_path(predecessors, route), assign_dropoffs(distances, home_indices, route)
+
+
+def heuristic_route(distances, home_indices, starting_car_index):
+    route = nearest_neighbor_route(distances, home_indices, starting_car_index)
+    return improve_route(distances, home_indices, route)
+
+
+def solve_heuristic(distances, predecessors, home_indices, starting_car_index):
+    """
+    Builds a route over the start and the homes, improves it with local search and returns the car
+    path and dropoffs in the format of solve().
+    """
+    route = heuristic_route(distances, home_indices, starting_car_index)
+    return route_to_path(predecessors, route), assign_dropoffs(distances, home_indices, route)
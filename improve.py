@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import argparse
+from functools import partial
+from multiprocessing import Pool
+import utils
+from heuristic import improve_solution, EPSILON
+from instance_cache import load_instance
+from solution_store import SolutionStore, store_path, file_hash, load_stored_solution, OPTIMAL, FEASIBLE
+from solver import solution_to_string
+from student_utils import cost_of_solution
+
+
+def improve_file(input_file, output_directory):
+    """
+    Runs local search from the stored solution of input_file, or its .out file, and stores the result
+    and rewrites the .out file if that is strictly cheaper. Optimal solutions are left alone.
+    Returns (input file, cost before, cost after), with None for costs that are not known.
+    """
+    output_file = utils.input_to_output(input_file, output_directory)
+    store = SolutionStore(store_path(output_directory))
+    content_hash = file_hash(input_file)
+    try:
+        instance = load_instance(input_file)
+        existing, solution = load_stored_solution(store, input_file, content_hash, output_file, instance.names)
+        if existing is None:
+            return input_file, None, None
+        if existing['status'] == OPTIMAL:
+            return input_file, existing['cost'], existing['cost']
+
+        distances, predecessors = instance.shortest_paths()
+        car_path, drop_offs = solution
+        cost, message = cost_of_solution(instance, car_path, drop_offs)
+        car_path, drop_offs = improve_solution(distances, predecessors, instance.home_indices, car_path)
+        new_cost, message = cost_of_solution(instance, car_path, drop_offs)
+        if new_cost == 'infinite' or (cost != 'infinite' and new_cost >= cost - EPSILON * max(1, abs(cost))):
+            return input_file, existing['cost'], existing['cost']
+
+        solution = solution_to_string(car_path, drop_offs, instance.names)
+        if store.record(input_file, content_hash, new_cost, existing['bound'], FEASIBLE, solution, settings={'improve': 1}):
+            utils.write_to_file_atomic(output_file, solution)
+        return input_file, existing['cost'], new_cost
+    finally:
+        store.close()
+
+
+def improve_all(input_directory, output_directory, jobs=1):
+    """
+    Improves the solutions of every input file in input_directory across jobs processes and prints
+    every one that got cheaper.
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    improved = 0
+    with Pool(jobs) as pool:
+        for input_file, cost, new_cost in pool.imap_unordered(partial(improve_file, output_directory=output_directory), input_files):
+            if cost is not None and new_cost < cost:
+                improved += 1
+                print(input_file, cost, '->', new_cost)
+    print(f'Improved {improved} of {len(input_files)} solutions')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('--all', action='store_true', help='If specified, the solutions of all files in the input directory are improved. Else, just that of the given input file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of input files to improve in parallel when --all is given')
+    parser.add_argument('input', type=str, help='The path to the input file or directory')
+    parser.add_argument('output_directory', type=str, help='The path to the directory with the outputs to improve')
+    args = parser.parse_args()
+    if args.all:
+        improve_all(args.input, args.output_directory, args.jobs)
+    else:
+        print(*improve_file(args.input, args.output_directory))
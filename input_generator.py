@@ -1,90 +1,138 @@
 #!/usr/bin/env python3
 
+import os
+import sys
 import argparse
-from random import random, shuffle
-from math import floor, sqrt
-from decimal import Decimal
+from multiprocessing import Pool
+import numpy as np
 from utils import write_to_file
-import utils
-from solver import solve, convertToFile
-from student_utils import data_parser, adjacency_matrix_to_graph, is_metric
+from solver import solve, solution_to_string
+from shortest_paths import floyd_warshall
+from heuristic import solve_heuristic
+from student_utils import weights_are_metric
 
-def random_subset(values, count: int):
-  ret = []
-  while len(ret) < count:
-    next_index = floor(random() * len(values))
-    ret.append(values[next_index])
-    del values[next_index]
-  return ret
+# Probability that a road joins two locations
+ROAD_PROBABILITY = 0.25
 
-def generate_names(count: int):
-  names = [str(i) for i in range(0, count)]
-  shuffle(names)
-  return names
+def generate_instance(locations: int, tas: int, rng=None):
+  """
+  Random instance over points in the unit square, whose roads join each pair of points with
+  probability ROAD_PROBABILITY and are as long as the distance between them, rounded to 5 decimals.
+  Returns the location names, the home indices, the starting car index and the weights of the roads
+  (inf where there is none).
+  """
+  rng = rng if rng is not None else np.random.default_rng()
+  points = rng.random((locations, 2))
+  lengths = np.hypot(points[:, None, 0] - points[None, :, 0], points[:, None, 1] - points[None, :, 1])
+  # read back what gets written to the file, so that the checks see the rounded lengths
+  lengths = np.char.mod('%.5f', lengths).astype(float)
 
-def generate_input(locations: int, tas: int) -> str:
-  all_locations = [(random(), random()) for i in range(0, locations)]
-  location_names = generate_names(locations)
-  ta_locations = random_subset(list(range(0, locations)), tas)
+  roads = np.triu(rng.random((locations, locations)) < ROAD_PROBABILITY, 1)
+  roads |= roads.T
+  weights = np.where(roads, lengths, np.inf)
+  np.fill_diagonal(weights, 0)
+
+  names = [str(i) for i in rng.permutation(locations)]
+  home_indices = [int(home) for home in rng.choice(locations, tas, replace=False)]
+  return names, home_indices, int(rng.integers(locations)), weights
+
+def format_input(names, home_indices, starting_car_index, weights) -> str:
+  roads = np.isfinite(weights)
+  np.fill_diagonal(roads, False)
+  matrix = np.where(roads, np.char.mod('%.5f', np.where(roads, weights, 0)), 'x')
 
   output = ""
-  output += str(locations) + "\n"
-  output += str(tas) + "\n"
-  output += " ".join(location_names) + "\n"
-  output += " ".join(map(lambda i: location_names[i], ta_locations)) + "\n"
-  output += location_names[floor(random() * locations)] + "\n"
+  output += str(len(names)) + "\n"
+  output += str(len(home_indices)) + "\n"
+  output += " ".join(names) + "\n"
+  output += " ".join(names[i] for i in home_indices) + "\n"
+  output += names[starting_car_index] + "\n"
+  output += "\n".join(" ".join(row) for row in matrix)
+  return output
 
-  matrix = [[ "x" for i in range(0, locations)] for j in range(0, locations)]
-  for i in range(0, locations):
-    for j in range(0, i):
-      if random() < 0.25:
-        i_loc = all_locations[i]
-        j_loc = all_locations[j]
-        delta_x = i_loc[0] - j_loc[0]
-        delta_y = i_loc[1] - j_loc[1]
-        dist = sqrt(delta_x * delta_x + delta_y * delta_y)
-        matrix[i][j] = str(round(Decimal(dist), 5))
-      matrix[j][i] = matrix[i][j]
+def generate_input(locations: int, tas: int) -> str:
+  return format_input(*generate_instance(locations, tas))
 
-  for i in range(0, locations):
-    if i > 0:
-      output += "\n"
-    for j in range(0, locations):
-      if j > 0:
-        output += " "
-      output += matrix[i][j]
+def revisits(car_path):
+  """
+  Whether the car path visits a location twice, not counting that it starts and ends at the start.
+  """
+  inner = car_path[1:-1]
+  return len(set(inner)) < len(inner)
 
-  return output
+def screen(weights, home_indices, starting_car_index):
+  """
+  Cheap checks of a generated instance before any exact solve: its roads have positive lengths, its
+  graph is connected and metric, and the heuristic route already visits a location twice.
+  """
+  roads = np.isfinite(weights)
+  np.fill_diagonal(roads, False)
+  if not np.all(weights[roads] > 0):
+    return False
+  distances, predecessors = floyd_warshall(weights)
+  if not np.all(np.isfinite(distances)) or not weights_are_metric(weights, distances):
+    return False
+  path, dropoffs = solve_heuristic(distances, predecessors, home_indices, starting_car_index)
+  return revisits(path)
+
+def generate_hard_instance(task):
+  """
+  Generates instances until one passes screen() and the route of solve() visits a location twice.
+  Returns the contents of its input and output files and the number of instances generated, or
+  None if no instance out of max_attempts qualified.
+  """
+  locations, tas, seed, params, max_attempts = task
+  rng = np.random.default_rng(seed)
+  for attempt in range(1, max_attempts + 1):
+    names, home_indices, starting_car_index, weights = generate_instance(locations, tas, rng)
+    if not screen(weights, home_indices, starting_car_index):
+      continue
+    adjacency_matrix = np.where(np.isfinite(weights), weights, np.nan)
+    car_path, drop_offs, is_optimal = solve(names, [names[i] for i in home_indices], names[starting_car_index], adjacency_matrix, params=params)
+    if revisits(car_path):
+      return format_input(names, home_indices, starting_car_index, weights), solution_to_string(car_path, drop_offs, names), attempt
+  return None
+
+def generate_batch(output_directory, count, locations, tas, params=[], jobs=1, max_attempts=1000, seed=None):
+  """
+  Writes count instances that require multiple visits to output_directory as <k>_<locations>.in,
+  each with the solution that shows it as <k>_<locations>.out. The instances are generated in
+  parallel, each from its own seed derived from seed.
+  """
+  seeds = np.random.SeedSequence(seed).spawn(count)
+  tasks = [(locations, tas, task_seed, params, max_attempts) for task_seed in seeds]
+  with Pool(jobs) as pool:
+    for k, result in enumerate(pool.imap(generate_hard_instance, tasks)):
+      if result is None:
+        print(f'instance {k}: none of {max_attempts} attempts requires multiple visits', file=sys.stderr)
+        continue
+      input_text, output_text, attempts = result
+      basename = os.path.join(output_directory, f'{k}_{locations}')
+      write_to_file(basename + '.in', input_text)
+      write_to_file(basename + '.out', output_text)
+      print(f'{basename}.in after {attempts} attempts', file=sys.stderr)
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='Parsing arguments')
+  parser.add_argument('--count', type=int, default=None, help='Number of instances to write to the output directory. Else a single instance is written to <locations>.in')
+  parser.add_argument('--output-directory', type=str, default='.', help='The directory to write the instances to when --count is given')
+  parser.add_argument('--jobs', type=int, default=1, help='Number of instances to generate in parallel')
+  parser.add_argument('--time', type=float, default=60, help='Time budget in seconds of the solve that confirms each instance')
+  parser.add_argument('--max-attempts', type=int, default=1000, help='Number of random instances to try for each instance written')
+  parser.add_argument('--seed', type=int, default=None, help='Seed to make the generated instances reproducible')
   parser.add_argument('locations', type=int)
   parser.add_argument('tas', type=int)
   args = parser.parse_args()
 
-  while True:
-    write_to_file(str(args.locations) + ".in", generate_input(args.locations, args.tas))
-    input_file = str(args.locations) + ".in"
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
-    G, adj_message = adjacency_matrix_to_graph(adjacency_matrix)
-    if not is_metric(G):
-      print("not metric!")
-      continue
-
-    car_path, drop_offs = solve(list_locations, list_houses, starting_car_location, adjacency_matrix, params=[])
-    
-    seen = []
-    duplicate_found = False
-    for nxt in car_path[1:-1]:
-      if nxt in seen:
-        print("duplicate city found!", nxt)
-        duplicate_found = True
-        break
-      else:
-        seen.append(nxt)
-    
-    if duplicate_found:
-      output_file = str(args.locations) + ".out"
-      convertToFile(car_path, drop_offs, output_file, list_locations)
-      break
+  params = [f'time={args.time}', f'threads={max(1, (os.cpu_count() or 1) // args.jobs)}']
+  if args.count is None:
+    result = generate_hard_instance((args.locations, args.tas, args.seed, params, args.max_attempts))
+    if result is None:
+      print(f'none of {args.max_attempts} attempts requires multiple visits', file=sys.stderr)
+      sys.exit(1)
+    input_text, output_text, attempts = result
+    write_to_file(str(args.locations) + ".in", input_text)
+    write_to_file(str(args.locations) + ".out", output_text)
+  else:
+    os.makedirs(args.output_directory, exist_ok=True)
+    generate_batch(args.output_directory, args.count, args.locations, args.tas, params, args.jobs, args.max_attempts, args.seed)
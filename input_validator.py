@@ -6,9 +6,12 @@ sys.path.append('../..')
 import os
 import argparse
 import utils
-import networkx as nx
+import csv
 import numpy as np
+from multiprocessing import Pool
 from student_utils import *
+from instance_cache import load_input
+from shortest_paths import adjacency_matrix_to_weights, shortest_distances
 
 # Change these if you want to allow files with different names and/or graph sizes
 RANGE_OF_INPUT_SIZES = [50, 100, 200]
@@ -29,13 +32,13 @@ def validate_all_inputs(input_directory, params=[]):
 
 
 def tests(input_file, params=[]):
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
+    return check_instance(load_input(input_file), os.path.basename(input_file))
+
+
+def check_file_name(file_basename, num_of_locations):
     message = ''
     error = False
 
-    file_basename = os.path.basename(input_file)
-
     # check name constraints
     if file_basename not in VALID_FILENAMES:
         message += f'Your file is named {file_basename}. The allowed file names are: {RANGE_OF_INPUT_SIZES}.\n'
@@ -45,8 +48,23 @@ def tests(input_file, params=[]):
         if file_basename == VALID_FILENAMES[i] and (int(num_of_locations) > RANGE_OF_INPUT_SIZES[i]):
             message += f'Your file is named {file_basename}, but the size of the input is {num_of_locations}.\n'
             error = True
+    return message, error
+
+
+def check_instance(parsed_input, file_basename, shortest=None):
+    """
+    The checks of tests() on an already parsed input. shortest can be given to reuse the shortest path
+    distances of the instance if they are already known. The file name is not checked if file_basename is None.
+    """
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = parsed_input
+    message = ''
+    error = False
+
+    if file_basename is not None:
+        message, error = check_file_name(file_basename, num_of_locations)
 
-    if not all(name.isalnum() and len(name) <= MAX_NAME_LENGTH for name in list_locations):
+    names = np.array(list_locations, dtype=str)
+    if names.size and not np.all(np.char.isalnum(names) & (np.char.str_len(names) <= MAX_NAME_LENGTH)):
         message += f'One or more of the names of your locations are either not alphanumeric or are above the max length of {MAX_NAME_LENGTH}.\n'
         error = True
 
@@ -64,7 +82,7 @@ def tests(input_file, params=[]):
         error = True
 
     # check containment
-    if any(house not in list_locations for house in list_houses):
+    if not set(list_houses) <= set(list_locations):
         message += f'You listed at least one house that is not an actual location. Ahh!\n'
         error = True
 
@@ -86,24 +104,32 @@ def tests(input_file, params=[]):
         message += f'The dimensions of your adjacency matrix do not match the number of locations you provided.\n'
         error = True
 
-    if not all(entry == 'x' or (type(entry) is float and entry > 0 and entry <= 2e9 and decimal_digits_check(entry)) for row in adjacency_matrix for entry in row):
+    if isinstance(adjacency_matrix, np.ndarray):
+        entries = adjacency_matrix[~np.isnan(adjacency_matrix)]
+        entries_valid = bool(np.all((entries > 0) & (entries <= 2e9) & decimal_digits_check_array(entries)))
+    else:
+        entries_valid = all(entry == 'x' or (type(entry) is float and entry > 0 and entry <= 2e9 and decimal_digits_check(entry)) for row in adjacency_matrix for entry in row)
+    if not entries_valid:
         message += f'Your adjacency matrix may only contain the character "x", or strictly positive integers less than 2e+9, or strictly positive floats with less than 5 decimal digits.\n'
         error = True
 
     # if not square, terminate
-    if len(set(map(len, adjacency_matrix))) != 1 or len(adjacency_matrix[0]) != len(adjacency_matrix):
+    rectangular = isinstance(adjacency_matrix, np.ndarray) or len(set(map(len, adjacency_matrix))) == 1
+    if not rectangular or len(adjacency_matrix[0]) != len(adjacency_matrix):
         message += f'Your adjacency matrix must be square.\n'
         error = True
         return message, error
 
-    adjacency_matrix_numpy = np.matrix(adjacency_matrix)
+    adjacency_matrix = adjacency_matrix_to_array(adjacency_matrix)
+    missing = np.isnan(adjacency_matrix)
 
     # check requirements on square matrix
-    if not np.all(adjacency_matrix_numpy.T == adjacency_matrix_numpy):
+    symmetric = bool(np.all((adjacency_matrix.T == adjacency_matrix) | (missing.T & missing)))
+    if not symmetric:
         message += f'Your adjacency matrix is not symmetric.\n'
         error = True
 
-    G, adj_message = adjacency_matrix_to_graph(adjacency_matrix)
+    adj_message = self_loop_message(adjacency_matrix)
 
     # if failed to create adjacency matrix, terminate
     if adj_message:
@@ -111,11 +137,21 @@ def tests(input_file, params=[]):
         error = True
         return message, error
 
-    if not nx.is_connected(G):
+    weights = adjacency_matrix_to_weights(adjacency_matrix)
+    if not symmetric:
+        # check the undirected graph networkx builds from the matrix: a road wherever either entry has one,
+        # with the length of the entry below the diagonal if that has one
+        weights = np.where(np.isfinite(weights), weights, weights.T)
+        weights = np.where(np.tri(len(weights), dtype=bool), weights, weights.T)
+        shortest = None
+    if shortest is None:
+        shortest = shortest_distances(weights)
+
+    if not np.all(np.isfinite(shortest)):
         message += 'Your graph is not connected.\n'
         error = True
 
-    if not is_metric(G):
+    if not weights_are_metric(weights, shortest):
         message += 'Your graph is not metric.\n'
         error = True
 
@@ -124,15 +160,50 @@ def tests(input_file, params=[]):
     return message, error
 
 
+def summarize_input(input_file):
+    """
+    Validates one input like tests(), without printing. File names are not checked, as the instance
+    sets use names like 1_50.in. Returns a summary row (input file, number of locations, number of
+    houses, valid, error).
+    """
+    try:
+        parsed_input = load_input(input_file)
+        message, error = check_instance(parsed_input, None)
+    except Exception as e:
+        return input_file, '', '', False, f'{type(e).__name__}: {e}'
+    return input_file, parsed_input[0], parsed_input[1], not error, message.strip().replace('\n', ' ') if error else ''
+
+
+def validate_all_inputs_batch(input_directory, summary_file, jobs=1):
+    """
+    Validates every input in input_directory across jobs processes and writes a summary table
+    with one row per input file to summary_file.
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    with Pool(jobs) as pool:
+        rows = pool.map(summarize_input, input_files, chunksize=8)
+    with open(summary_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'locations', 'houses', 'valid', 'error'])
+        writer.writerows(rows)
+    print(f'{sum(row[3] for row in rows)} of {len(rows)} inputs are valid, summary written to {summary_file}')
+    return rows
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the input validator is run on all files in the input directory. Else, it is run on just the given input file.')
+    parser.add_argument('--summary', type=str, default=None, help='With --all, validate in batch mode and write a table of file, locations, houses, valid and error to this CSV file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of processes to validate with in batch mode')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
     if args.all:
         input_directory = args.input
-        validate_all_inputs(input_directory, params=args.params)
+        if args.summary:
+            validate_all_inputs_batch(input_directory, args.summary, jobs=args.jobs)
+        else:
+            validate_all_inputs(input_directory, params=args.params)
     else:
         input_file = args.input
         validate_input(input_file, params=args.params)
@@ -0,0 +1,107 @@
+import hashlib
+import numpy as np
+import networkx as nx
+
+from shortest_paths import adjacency_matrix_to_weights, floyd_warshall
+
+
+class Instance:
+    """
+    A parsed input as arrays, so that looking up a road is indexing instead of a networkx query.
+        names: name of every location, index: location index of every name
+        home_indices, starting_car_index: in terms of location indices
+        weights: road lengths, inf where there is no road and 0 on the diagonal
+        roads: True where there is a road
+        distances, predecessors: as returned by floyd_warshall, once shortest_paths() computed them
+    graph() builds a networkx graph of the instance for the code that needs one.
+    fingerprint() identifies the instance regardless of its location names and their order.
+    """
+
+    __slots__ = ('names', 'index', 'home_indices', 'starting_car_index', 'weights', 'roads', 'distances', 'predecessors')
+
+    def __init__(self, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix):
+        self.names = list_of_locations
+        self.index = {}
+        for i, name in enumerate(list_of_locations):
+            self.index.setdefault(name, i)
+        self.home_indices = [self.index[home] for home in list_of_homes]
+        self.starting_car_index = self.index[starting_car_location]
+        self.weights = adjacency_matrix_to_weights(adjacency_matrix)
+        self.roads = np.isfinite(self.weights)
+        np.fill_diagonal(self.roads, False)
+        self.distances, self.predecessors = None, None
+
+    def shortest_paths(self):
+        """
+        floyd_warshall of the weights, computed on the first call only.
+        """
+        if self.distances is None:
+            self.distances, self.predecessors = floyd_warshall(self.weights)
+        return self.distances, self.predecessors
+
+    def graph(self):
+        """
+        Undirected networkx graph with a 'weight' on every road, like adjacency_matrix_to_graph builds.
+        """
+        return nx.from_numpy_array(np.where(self.roads, self.weights, 0))
+
+    def canonical_order(self):
+        """
+        Order of the locations that only depends on the roads, homes and start, not on names or the
+        order of the input. Locations are ranked by whether they are the start or a home and by their
+        road lengths, and the ranks are refined by the ranks of the neighbors until they are stable.
+        Locations still tied, as in symmetric instances, are told apart by their index in turn, so
+        such instances may get a different order when relabeled, but never the order of another one.
+        Returns order, with order[k] the location at canonical position k.
+        """
+        n = len(self.names)
+        weights = np.where(self.roads, self.weights, np.inf)
+        kind = np.zeros(n)
+        kind[self.home_indices] = 1
+        kind[self.starting_car_index] += 2
+        ranks = row_ranks(np.column_stack((kind, np.sort(weights, axis=1))))
+        while True:
+            ranks = refine_ranks(weights, ranks)
+            if ranks.max() == n - 1:
+                return np.argsort(ranks).tolist()
+            tied = np.flatnonzero(np.bincount(ranks) > 1)[0]
+            first = np.flatnonzero(ranks == tied)[0]
+            ranks = row_ranks(np.column_stack((ranks, np.arange(n) != first)))
+
+    def fingerprint(self):
+        """
+        Hash of the instance with its locations in canonical_order(), so that instances that only differ
+        in location names or order share it. Returns (fingerprint, order).
+        """
+        order = self.canonical_order()
+        position = np.empty(len(order), dtype=int)
+        position[order] = np.arange(len(order))
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(self.weights[np.ix_(order, order)]).tobytes())
+        digest.update(np.array(sorted(position[self.home_indices].tolist()) + [position[self.starting_car_index]]).tobytes())
+        return digest.hexdigest(), order
+
+
+def row_ranks(rows):
+    """
+    Rank of every row among the distinct rows, in lexicographic order.
+    """
+    order = np.lexsort(rows.T[::-1])
+    ordered = rows[order]
+    ranks = np.empty(len(rows), dtype=int)
+    ranks[order] = np.concatenate(([0], np.cumsum(np.any(ordered[1:] != ordered[:-1], axis=1))))
+    return ranks
+
+
+def refine_ranks(weights, ranks):
+    """
+    Splits ranks by the sorted (road length, rank) pairs of the neighbors of every location, until
+    that splits no more.
+    """
+    while True:
+        neighbor_ranks = np.where(np.isfinite(weights), ranks[None, :], len(ranks))
+        order = np.lexsort((neighbor_ranks, weights), axis=1)
+        refined = row_ranks(np.column_stack((ranks, np.take_along_axis(weights, order, 1), np.take_along_axis(neighbor_ranks, order, 1))))
+        if refined.max() == ranks.max():
+            return refined
+        ranks = refined
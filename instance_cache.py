@@ -0,0 +1,123 @@
+import os
+import json
+import numpy as np
+import utils
+from student_utils import data_parser
+from instance import Instance
+
+# Directory next to the input files where the parsed instances are kept
+CACHE_DIRECTORY = '.instance_cache'
+
+
+def cache_files(input_file):
+    """
+    Paths of the names index (json) and the adjacency matrix (npy) cached for input_file.
+    """
+    directory, name = os.path.split(input_file)
+    base = os.path.join(directory, CACHE_DIRECTORY, name)
+    return base + '.json', base + '.npy'
+
+
+def read_cache(input_file):
+    """
+    The parsed instance stored for input_file, or None if there is none or input_file changed since.
+    The adjacency matrix is memory-mapped read-only.
+    """
+    index_file, matrix_file = cache_files(input_file)
+    try:
+        source = os.stat(input_file)
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index['source_mtime'] != source.st_mtime_ns or index['source_size'] != source.st_size:
+            return None
+        adjacency_matrix = np.load(matrix_file, mmap_mode='r', allow_pickle=False)
+    except (OSError, KeyError, ValueError):
+        return None
+    return (
+        index['num_of_locations'],
+        index['num_houses'],
+        index['list_locations'],
+        index['list_houses'],
+        index['starting_car_location'],
+        adjacency_matrix,
+    )
+
+
+def write_cache(input_file, parsed):
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = parsed
+    source = os.stat(input_file)
+    index_file, matrix_file = cache_files(input_file)
+    index = {
+        'source_mtime': source.st_mtime_ns,
+        'source_size': source.st_size,
+        'num_of_locations': num_of_locations,
+        'num_houses': num_houses,
+        'list_locations': list_locations,
+        'list_houses': list_houses,
+        'starting_car_location': starting_car_location,
+    }
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        # the index is written last, so a reader never pairs it with a stale matrix
+        temporary_file = f'{matrix_file}.{os.getpid()}.tmp'
+        with open(temporary_file, 'wb') as f:
+            np.save(f, adjacency_matrix, allow_pickle=False)
+        os.replace(temporary_file, matrix_file)
+        utils.write_to_file_atomic(index_file, json.dumps(index))
+    except OSError:
+        pass
+
+
+def parse_input(input_file):
+    """
+    Parses input_file line by line, with the rows of the adjacency matrix going straight into a
+    preallocated float array with nan for 'x'. Returns the values of data_parser with that array as
+    the adjacency matrix, followed by a boolean array that is True where there is a road.
+    Raises ValueError if the adjacency matrix is not square.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        lines = (line.replace("Â", " ").split() for line in f)
+        header = [next(lines, []) for _ in range(5)]
+        num_of_locations = int(header[0][0])
+        num_houses = int(header[1][0])
+        list_locations = header[2]
+        list_houses = header[3]
+        starting_car_location = header[4][0]
+
+        adjacency_matrix = None
+        for i, row in enumerate(lines):
+            if adjacency_matrix is None:
+                adjacency_matrix = np.empty((len(row), len(row)))
+            if i >= len(adjacency_matrix) or len(row) != len(adjacency_matrix):
+                raise ValueError('The adjacency matrix is not square.')
+            adjacency_matrix[i] = [np.nan if entry == 'x' else float(entry) for entry in row]
+        if adjacency_matrix is None or i != len(adjacency_matrix) - 1:
+            raise ValueError('The adjacency matrix is not square.')
+    return num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix, ~np.isnan(adjacency_matrix)
+
+
+def load_input(input_file):
+    """
+    Same values as data_parser(utils.read_file(input_file)), except that the adjacency matrix is a float
+    array with nan for 'x', as read by parse_input. The parsed instance is cached next to input_file and
+    reused as long as input_file is unchanged. If the adjacency matrix is not square it is returned as
+    nested lists, for the validators to report on.
+    """
+    parsed = read_cache(input_file)
+    if parsed is not None:
+        return parsed
+
+    try:
+        parsed = parse_input(input_file)[:6]
+    except ValueError:
+        return data_parser(utils.read_file(input_file))
+    write_cache(input_file, parsed)
+    return parsed
+
+
+def load_instance(input_file):
+    """
+    The Instance of input_file, parsed by load_input.
+    """
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = load_input(input_file)
+    return Instance(list_locations, list_houses, starting_car_location, adjacency_matrix)
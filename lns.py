@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import argparse
+from functools import partial
+from itertools import cycle
+from multiprocessing import Pool
+import numpy as np
+import utils
+from formulation import RouteModel, candidate_stops
+from heuristic import route_cost, improve_route, heuristic_route, route_from_path, route_to_path, assign_dropoffs, improvement_threshold
+from instance_cache import load_instance
+from solution_store import SolutionStore, store_path, file_hash, load_stored_solution, OPTIMAL, FEASIBLE
+from solver import solution_to_string
+from student_utils import cost_of_solution
+
+# Number of locations that may change in a neighborhood
+NEIGHBORHOOD_SIZE = 15
+
+# Seconds the MIP of a neighborhood gets
+NEIGHBORHOOD_SECONDS = 10
+
+
+def cluster_region(distances, home_indices, route, rng, size):
+    """
+    The size locations closest to a random home.
+    """
+    center = home_indices[rng.integers(len(home_indices))]
+    return set(np.argsort(distances[center], kind='stable')[:size].tolist())
+
+
+def segment_region(distances, home_indices, route, rng, size):
+    """
+    A random segment of the route and the locations closest to it, size locations in total.
+    """
+    first = int(rng.integers(len(route)))
+    segment = [route[(first + k) % len(route)] for k in range(min(len(route), max(1, size // 4)))]
+    return set(np.argsort(distances[segment].min(axis=0), kind='stable')[:size].tolist())
+
+
+# Ways to pick the region of a neighborhood, used in turn
+NEIGHBORHOODS = {'cluster': cluster_region, 'segment': segment_region}
+
+
+def solve_neighborhood(task, distances, home_indices, starting_car_index, formulation='cuts', size=NEIGHBORHOOD_SIZE, max_seconds=NEIGHBORHOOD_SECONDS):
+    """
+    Re-optimizes a route within a region picked by the neighborhood of the task. Only TAs whose home
+    or stop is in the region are placed again, at their candidate stops among the region and the
+    route, and only arcs into or out of the region are free. Every other stop of the route is kept
+    by a TA pinned to it, living at the stop, and every other arc of the route is fixed.
+    The MIP runs over the metric closure of these locations, warm started from the route.
+    Returns (cost, route) of the best route found, which is the given one if there is no better.
+    """
+    route, neighborhood, seed = task
+    rng = np.random.default_rng(seed)
+    region = NEIGHBORHOODS[neighborhood](distances, home_indices, route, rng, size)
+    closest_stop = np.array(route)[distances[np.ix_(home_indices, route)].argmin(axis=1)]
+    free = [ta for ta, home in enumerate(home_indices) if home in region or closest_stop[ta] in region]
+    pinned = [stop for stop in route[1:] if stop not in region]
+    if not free:
+        return route_cost(distances, home_indices, route), route
+
+    locations = sorted(set(route) | region | set(home_indices[ta] for ta in free))
+    index = {location: i for i, location in enumerate(locations)}
+    sub_distances = distances[np.ix_(locations, locations)]
+    movable = np.array([location in region for location in locations])
+    tour = [index[stop] for stop in route + [route[0]]]
+    route_arcs = [(u, v) for u, v in zip(tour[:-1], tour[1:]) if u != v]
+    roads = movable[:, None] | movable[None, :]
+    for u, v in route_arcs:
+        roads[u, v] = True
+    sub_weights = np.where(roads, sub_distances, np.inf)
+    np.fill_diagonal(sub_weights, 0)
+
+    start = index[starting_car_index]
+    on_route = set(tour)
+    sub_homes = [index[home_indices[ta]] for ta in free] + [index[stop] for stop in pinned]
+    stops = [[stop for stop in ta_stops if movable[stop] or stop in on_route] for ta_stops in candidate_stops(sub_distances, sub_homes[:len(free)], start)]
+    stops += [[start, index[stop]] for stop in pinned]
+
+    route_model = RouteModel(sub_weights, sub_distances, sub_homes, start, stops=stops, formulation=formulation)
+    route_model.model.verbose = 0
+    route_model.model.threads = 1
+    for ta, stop in enumerate(pinned, len(free)):
+        route_model.drop_ta_at_stop[ta][index[stop]].lb = 1
+    for u, v in route_arcs:
+        if not movable[u] and not movable[v]:
+            route_model.edge_taken[u, v].lb = 1
+
+    dropoffs = {}
+    for ta in free:
+        dropoffs.setdefault(index[int(closest_stop[ta])], []).append(index[home_indices[ta]])
+    for stop in pinned:
+        dropoffs.setdefault(index[stop], []).append(index[stop])
+    route_model.model.start = route_model.start_values(tour, dropoffs)
+
+    route_model.optimize(max_seconds)
+    if route_model.incumbent is None:
+        return route_cost(distances, home_indices, route), route
+    path = [locations[node] for node in route_model.incumbent[0]]
+    new_route = improve_route(distances, home_indices, route_from_path(distances, home_indices, path))
+    candidates = [(route_cost(distances, home_indices, new_route), new_route), (route_cost(distances, home_indices, route), route)]
+    return min(candidates, key=lambda candidate: candidate[0])
+
+
+def lns(distances, home_indices, starting_car_index, route, max_seconds, jobs=1, formulation='cuts', size=NEIGHBORHOOD_SIZE,
+        neighborhood_seconds=NEIGHBORHOOD_SECONDS, seed=None, on_improvement=None):
+    """
+    Large neighborhood search from route for max_seconds of wall-clock time. Every round solves jobs
+    neighborhoods of the current route in parallel, see solve_neighborhood, and moves on from the
+    cheapest route they found. on_improvement(route, cost) is called with every better route.
+    Returns the best route.
+    """
+    deadline = time.time() + max_seconds
+    threshold = improvement_threshold(distances)
+    cost = route_cost(distances, home_indices, route)
+    seeds = np.random.SeedSequence(seed)
+    neighborhoods = cycle(NEIGHBORHOODS)
+    with Pool(jobs) as pool:
+        while deadline - time.time() >= 1:
+            seconds = min(neighborhood_seconds, deadline - time.time())
+            tasks = [(route, next(neighborhoods), task_seed) for task_seed in seeds.spawn(jobs)]
+            results = pool.map(partial(solve_neighborhood, distances=distances, home_indices=home_indices, starting_car_index=starting_car_index,
+                                       formulation=formulation, size=size, max_seconds=seconds), tasks)
+            new_cost, new_route = min(results, key=lambda result: result[0])
+            if new_cost - cost < threshold:
+                route, cost = new_route, new_cost
+                if on_improvement is not None:
+                    on_improvement(route, cost)
+    return route
+
+
+def lns_from_file(input_file, output_directory, max_seconds, jobs=1, formulation='cuts', size=NEIGHBORHOOD_SIZE, neighborhood_seconds=NEIGHBORHOOD_SECONDS):
+    """
+    Runs lns() from the stored solution of input_file (or its .out file, or else a heuristic one),
+    unless that is optimal. Every better route is stored and written to the .out file right away.
+    """
+    print('Processing', input_file)
+    os.makedirs(output_directory, exist_ok=True)
+    output_file = utils.input_to_output(input_file, output_directory)
+    store = SolutionStore(store_path(output_directory))
+    content_hash = file_hash(input_file)
+    instance = load_instance(input_file)
+    existing, solution = load_stored_solution(store, input_file, content_hash, output_file, instance.names)
+    if existing is not None and existing['status'] == OPTIMAL:
+        print('Skipping, already solved optimal')
+        store.close()
+        return
+
+    distances, predecessors = instance.shortest_paths()
+    home_indices = instance.home_indices
+    if existing is not None:
+        route = route_from_path(distances, home_indices, solution[0])
+    else:
+        route = heuristic_route(distances, home_indices, instance.starting_car_index)
+    start_time = time.time()
+
+    def save(route, cost):
+        car_path, drop_offs = route_to_path(predecessors, route), assign_dropoffs(distances, home_indices, route)
+        cost, message = cost_of_solution(instance, car_path, drop_offs)
+        if cost == 'infinite' or (existing is not None and cost >= existing['cost']):
+            return
+        solution = solution_to_string(car_path, drop_offs, instance.names)
+        bound = existing['bound'] if existing is not None else None
+        settings = {'lns': 1, 'formulation': formulation, 'size': size}
+        if store.record(input_file, content_hash, cost, bound, FEASIBLE, solution, settings=settings, wall_time=time.time() - start_time):
+            utils.write_to_file_atomic(output_file, solution)
+            print(input_file, cost)
+
+    save(route, route_cost(distances, home_indices, route))
+    lns(distances, home_indices, instance.starting_car_index, route, max_seconds, jobs=jobs, formulation=formulation, size=size,
+        neighborhood_seconds=neighborhood_seconds, on_improvement=save)
+    store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('--all', action='store_true', help='If specified, every file in the input directory is improved in turn. Else, just the given input file')
+    parser.add_argument('--time', type=float, default=60, help='Wall-clock budget in seconds for each input file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of neighborhoods to solve in parallel')
+    parser.add_argument('--formulation', type=str, default='cuts', choices=['scf', 'mcf', 'cuts'], help='Formulation of the neighborhood MIPs')
+    parser.add_argument('--size', type=int, default=NEIGHBORHOOD_SIZE, help='Number of locations that may change in a neighborhood')
+    parser.add_argument('--neighborhood-time', type=float, default=NEIGHBORHOOD_SECONDS, help='Time budget in seconds of every neighborhood MIP')
+    parser.add_argument('input', type=str, help='The path to the input file or directory')
+    parser.add_argument('output_directory', type=str, help='The path to the directory with the outputs to improve')
+    args = parser.parse_args()
+    input_files = sorted(utils.get_files_with_extension(args.input, '.in')) if args.all else [args.input]
+    for input_file in input_files:
+        lns_from_file(input_file, args.output_directory, args.time, args.jobs, args.formulation, args.size, args.neighborhood_time)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os
+import argparse
+from functools import partial
+from multiprocessing import Pool
+import utils
+from formulation import RouteModel
+from preprocessing import ReducedInstance
+from instance_cache import load_instance
+from solution_store import SolutionStore, store_path, file_hash
+
+
+def lower_bound(weights, distances, home_indices, starting_car_index, max_seconds=10):
+    """
+    A lower bound on the cost of every solution: the LP relaxation of the 'cuts' formulation over the
+    reduced instance, strengthened with violated cuts for up to max_seconds, plus the walking cost of
+    the TAs fixed at the start. Returns None if not even one relaxation could be solved.
+    """
+    reduced = ReducedInstance(weights, distances, home_indices, starting_car_index)
+    if not reduced.home_indices:
+        return reduced.fixed_walking_cost
+    route_model = RouteModel(reduced.weights, reduced.distances, reduced.home_indices, reduced.starting_car_index, formulation='cuts')
+    route_model.model.verbose = 0
+    bound = route_model.solve_relaxation(max_seconds)
+    return None if bound is None else bound + reduced.fixed_walking_cost
+
+
+def lower_bound_from_file(input_file, max_seconds=10):
+    instance = load_instance(input_file)
+    distances, predecessors = instance.shortest_paths()
+    return input_file, lower_bound(instance.weights, distances, instance.home_indices, instance.starting_car_index, max_seconds)
+
+
+def bound_all(input_directory, output_directory, max_seconds=10, jobs=1):
+    """
+    Bounds every input file in input_directory and raises the bounds in the solution store of
+    output_directory. Prints the stored cost, the bound and the gap of every file, largest gap first.
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    with Pool(jobs) as pool:
+        bounds = pool.map(partial(lower_bound_from_file, max_seconds=max_seconds), input_files)
+
+    store = SolutionStore(store_path(output_directory))
+    rows = []
+    for input_file, bound in bounds:
+        content_hash = file_hash(input_file)
+        if bound is not None:
+            store.raise_bound(input_file, content_hash, bound)
+        row = store.get(input_file, content_hash)
+        cost = None if row is None else row['cost']
+        gap = None if cost is None or bound is None or cost == 0 else max(0, (cost - bound) / cost)
+        rows.append((input_file, cost, bound, gap))
+    store.close()
+
+    for input_file, cost, bound, gap in sorted(rows, key=lambda row: -1 if row[3] is None else row[3], reverse=True):
+        print(input_file, cost, bound, '' if gap is None else f'{gap:.2%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('--time', type=float, default=10, help='Time budget in seconds for the bound of each input file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of input files to bound in parallel')
+    parser.add_argument('input_directory', type=str, help='The path to the directory with the input files')
+    parser.add_argument('output_directory', type=str, help='The path to the directory with the solution store')
+    args = parser.parse_args()
+    os.makedirs(args.output_directory, exist_ok=True)
+    bound_all(args.input_directory, args.output_directory, args.time, args.jobs)
@@ -8,16 +8,21 @@ import argparse
 import utils
 from student_utils import *
 import input_validator
+from instance_cache import load_input
+from shortest_paths import adjacency_matrix_to_weights, shortest_distances
 import os
+import csv
+import numpy as np
+from multiprocessing import Pool
 
 def validate_output(input_file, output_file, params=[]):
     print('Processing', input_file)
 
-    input_data = utils.read_file(input_file)
+    parsed_input = load_input(input_file)
     output_data = utils.read_file(output_file)
 
     input_message, input_error = input_validator.tests(input_file)
-    cost, message = tests(input_data, output_data, params=params)
+    cost, message = tests(None, output_data, params=params, parsed_input=parsed_input)
     message = 'Comments about input file:\n\n' + input_message + 'Comments about output file:\n\n' + message
 
     print(message)
@@ -51,10 +56,55 @@ def validate_all_outputs(input_directory, output_directory, params=[]):
     return all_results
 
 
-def tests(input_data, output_data, params=[]):
-    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = data_parser(input_data)
+def summarize_output(files):
+    """
+    Validates one output like validate_output, parsing the input once and computing its shortest
+    paths once for both the input and the output checks, without printing. Input file names are not
+    checked, as the instance sets use names like 1_50.in.
+    Returns a summary row (output file, cost, valid, error).
+    """
+    input_file, output_file = files
+    if not os.path.exists(output_file):
+        return output_file, '', False, f'No corresponding .out file for {input_file}'
     try:
-        G, message = adjacency_matrix_to_graph(adjacency_matrix)
+        parsed_input = load_input(input_file)
+        shortest = None
+        if isinstance(parsed_input[5], np.ndarray) and parsed_input[5].shape[0] == parsed_input[5].shape[1]:
+            shortest = shortest_distances(adjacency_matrix_to_weights(parsed_input[5]))
+        input_message, input_error = input_validator.check_instance(parsed_input, None, shortest=shortest)
+        if input_error:
+            return output_file, 'infinite', False, 'The input is invalid: ' + input_message.strip().replace('\n', ' ')
+        cost, message = tests(None, utils.read_file(output_file), params=[], parsed_input=parsed_input, shortest=shortest)
+    except Exception as e:
+        return output_file, 'infinite', False, f'{type(e).__name__}: {e}'
+    if cost == 'infinite':
+        return output_file, cost, False, message.strip().replace('\n', ' ')
+    return output_file, cost, True, ''
+
+
+def validate_all_outputs_batch(input_directory, output_directory, summary_file, jobs=1):
+    """
+    Validates every output in output_directory across jobs processes and writes a summary table
+    with one row per input file to summary_file.
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    files = [(input_file, utils.input_to_output(input_file, output_directory)) for input_file in input_files]
+    with Pool(jobs) as pool:
+        rows = pool.map(summarize_output, files, chunksize=8)
+    with open(summary_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'cost', 'valid', 'error'])
+        writer.writerows(rows)
+    print(f'{sum(row[2] for row in rows)} of {len(rows)} outputs are valid, summary written to {summary_file}')
+    return rows
+
+
+def tests(input_data, output_data, params=[], parsed_input=None, shortest=None):
+    if parsed_input is None:
+        parsed_input = data_parser(input_data)
+    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = parsed_input
+    try:
+        weights = adjacency_matrix_to_weights(adjacency_matrix)
     except Exception:
         return 'Your adjacency matrix is not well formed.\n', 'infinite'
     message = ''
@@ -65,38 +115,44 @@ def tests(input_data, output_data, params=[]):
         message += f'Number of dropoffs in output ({len(output_data) - 2}) does not match number stated ({num_dropoffs}).\n'
         cost = 'infinite'
         return cost, message
+    location_name_to_index = location_indices(list_of_locations)
+    houses = set(list_of_houses)
+    car_cycle_locations = set(car_cycle)
     targets = []
+    seen_targets = set()
     dropoffs = {}
     for i in range(num_dropoffs):
         dropoff = output_data[i + 2]
-        if dropoff[0] not in list_of_locations:
+        if dropoff[0] not in location_name_to_index:
             message += 'At least one dropoff location is not an actual location.\n'
             cost = 'infinite'
-        if dropoff[0] not in car_cycle:
+            raise ValueError(f'{dropoff[0]!r} is not in list')
+        if dropoff[0] not in car_cycle_locations:
             message += 'At least one dropoff location is not in the path of the car.\n'
             cost = 'infinite'
-        dropoff_index = list_of_locations.index(dropoff[0])
-        if list_of_locations.index(dropoff[0]) in dropoffs.keys():
+        dropoff_index = location_name_to_index[dropoff[0]]
+        if dropoff_index in dropoffs:
             message += 'You have multiple dropoffs with the same location. Please compress them so that there is one dropoff'
             cost = 'infinite'
-        dropoffs[dropoff_index] = convert_locations_to_indices(dropoff[1:], list_of_locations)
+        dropoffs[dropoff_index] = [location_name_to_index.get(name) for name in dropoff[1:]]
         if len(dropoff) == 1:
             message += 'One dropoff location has nobody getting off; it should not be included in the list of dropoffs.\n'
             cost = 'infinite'
         for target in dropoff[1:]:
-            if target not in list_of_houses:
+            if target not in houses:
                 message += 'One of the targets is not a house.\n'
                 cost = 'infinite'
-            if target in targets:
+            if target in seen_targets:
                 message += 'One of the targets got off at multiple dropoffs'
                 cost = 'infinite'
             targets.append(target)
+            seen_targets.add(target)
 
-    if any(target not in list_of_locations for target in targets):
+    if any(target not in location_name_to_index for target in targets):
         message += 'At least one of the targets is not a valid location.\n'
         cost = 'infinite'
 
-    if any(home not in targets for home in list_of_houses):
+    if any(home not in seen_targets for home in list_of_houses):
         message += 'At least one student did not get home.\n'
         cost = 'infinite'
 
@@ -104,7 +160,7 @@ def tests(input_data, output_data, params=[]):
         message += "Your car must start at the specified starting location.\n"
         cost = 'infinite'
 
-    car_cycle = convert_locations_to_indices(car_cycle, list_of_locations)
+    car_cycle = [location_name_to_index.get(name) for name in car_cycle]
 
     if (car_cycle[0] != car_cycle[-1]):
         message += "Your car must start and end at the same location.\n"
@@ -114,7 +170,9 @@ def tests(input_data, output_data, params=[]):
         raise RuntimeError("BOO!")
 
     if cost != 'infinite':
-        cost, solution_message = cost_of_solution(G, car_cycle, dropoffs)
+        if shortest is None:
+            shortest = shortest_distances(weights)
+        cost, solution_message = cost_of_solution_in_weights(weights, shortest, car_cycle, dropoffs)
         message += solution_message
 
     return cost, message
@@ -123,13 +181,18 @@ def tests(input_data, output_data, params=[]):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the output validator is run on all files in the output directory. Else, it is run on just the given output file')
+    parser.add_argument('--summary', type=str, default=None, help='With --all, validate in batch mode and write a table of file, cost, valid and error to this CSV file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of processes to validate with in batch mode')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('output', type=str, help='The path to the output file or directory')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
     if args.all:
         input_directory, output_directory = args.input, args.output
-        validate_all_outputs(input_directory, output_directory, params=args.params)
+        if args.summary:
+            validate_all_outputs_batch(input_directory, output_directory, args.summary, jobs=args.jobs)
+        else:
+            validate_all_outputs(input_directory, output_directory, params=args.params)
     else:
         input_file, output_file = args.input, args.output
         validate_output(input_file, output_file, params=args.params)
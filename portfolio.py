@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import time
+import queue
+import argparse
+import multiprocessing
+import utils
+from mip import Model, GUROBI
+from solver import solve, solve_from_file, parse_params
+from solution_store import reaches_bound
+
+# Configurations raced against each other, as params added to the given ones
+PORTFOLIO = [
+    ['formulation=scf'],
+    ['formulation=mcf'],
+    ['formulation=cuts'],
+    ['formulation=scf', 'emphasis=2', 'cut_level=2'],
+    ['formulation=scf', 'backend=gurobi'],
+    ['formulation=mcf', 'backend=gurobi'],
+]
+
+# Seconds of the first time slice of every configuration, unless checkpoint is given in params
+SLICE_SECONDS = 5
+
+# Seconds past the time budget to wait for configurations to finish, as building their models takes time too
+GRACE_SECONDS = 10
+
+
+def gurobi_available():
+    try:
+        Model(solver_name=GUROBI)
+    except Exception:
+        return False
+    return True
+
+
+def configurations():
+    """
+    The configurations of PORTFOLIO that can run here, without Gurobi ones if Gurobi is not licensed.
+    """
+    has_gurobi = gurobi_available()
+    return [configuration for configuration in PORTFOLIO if has_gurobi or 'backend=gurobi' not in configuration]
+
+
+def run_configuration(index, arguments, params, initial_solution, best_cost, results):
+    """
+    Solves the instance with one configuration. Puts ('incumbent', index, path, dropoffs, cost, bound)
+    on results for every solution that is the best of all configurations so far, and finally
+    ('done', index, solution, stats) with what solve() returned.
+    """
+    def on_incumbent(path, dropoffs, cost, bound):
+        with best_cost.get_lock():
+            if cost >= best_cost.value:
+                return
+            best_cost.value = cost
+        results.put(('incumbent', index, path, dropoffs, cost, bound))
+
+    stats = {}
+    try:
+        sol = solve(*arguments, params=params, initial_solution=initial_solution, stats=stats, on_incumbent=on_incumbent, cutoff=lambda: best_cost.value)
+    except Exception as e:
+        sol, stats = None, {'error': repr(e)}
+    results.put(('done', index, sol, stats))
+
+
+def race(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, params=[], initial_solution=None, stats=None, on_incumbent=None):
+    """
+    solve() with every configuration of configurations() at once, each in its own process with its
+    share of the threads. The configurations solve in time slices, each of which only searches
+    for solutions cheaper than the best one any configuration has found so far. The race ends
+    when one configuration proves its solution optimal, all of them are done or the time is up.
+    Takes and returns the same as solve(). stats also gets the configuration of the returned
+    solution under 'winner' and the outcome of every configuration that finished under 'portfolio'.
+    """
+    options, _ = parse_params(params)
+    stats = stats if stats is not None else {}
+    racing = configurations()
+    params = params + [f'threads={max(1, options["threads"] // len(racing))}']
+    if not options['checkpoint']:
+        params.append(f'checkpoint={SLICE_SECONDS}')
+
+    arguments = (list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
+    best_cost = multiprocessing.Value('d', float('inf'))
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_configuration, args=(index, arguments, params + configuration, initial_solution, best_cost, results), daemon=True)
+        for index, configuration in enumerate(racing)
+    ]
+    for process in processes:
+        process.start()
+
+    deadline = time.time() + options['time'] + GRACE_SECONDS
+    best, bound, is_optimal, finished = None, None, False, 0
+    stats['portfolio'] = []
+    try:
+        while finished < len(processes) and not is_optimal:
+            try:
+                message = results.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                break
+            kind, index = message[:2]
+            if kind == 'incumbent':
+                path, dropoffs, cost, new_bound = message[2:]
+                found = (path, dropoffs, cost, index)
+            else:
+                finished += 1
+                sol, configuration_stats = message[2:]
+                stats['portfolio'].append({'configuration': racing[index], 'status': configuration_stats.get('status'), 'cost': configuration_stats.get('cost'),
+                                           'bound': configuration_stats.get('bound'), 'optimal': bool(sol) and sol[2], 'error': configuration_stats.get('error')})
+                if not sol:
+                    continue
+                found = (sol[0], sol[1], configuration_stats['cost'], index)
+                new_bound = configuration_stats['bound']
+                is_optimal = sol[2]
+
+            if new_bound is not None and (bound is None or new_bound > bound):
+                bound = new_bound
+            if best is None or found[2] < best[2] or (is_optimal and found[2] <= best[2]):
+                best = found
+                if on_incumbent is not None:
+                    on_incumbent(best[0], best[1], best[2], bound)
+            if best is not None and reaches_bound(best[2], bound):
+                is_optimal = True
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+    if best is None:
+        return None
+    path, dropoffs, stats['cost'], index = best
+    stats['bound'] = bound
+    stats['winner'] = racing[index]
+    return (path, dropoffs, is_optimal)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('--all', action='store_true', help='If specified, every file in the input directory is raced in turn. Else, just the given input file')
+    parser.add_argument('--threads', type=int, default=None, help='Total number of solver threads, split between the configurations')
+    parser.add_argument('--time-limit', type=float, default=None, help='Time budget in seconds for each input file')
+    parser.add_argument('input', type=str, help='The path to the input file or directory')
+    parser.add_argument('output_directory', type=str, nargs='?', default='.', help='The path to the directory where the output should be written')
+    parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
+    args = parser.parse_args()
+    params = args.params
+    if args.threads is not None:
+        params = params + [f'threads={args.threads}']
+    if args.time_limit is not None:
+        params = params + [f'time={args.time_limit}']
+    input_files = sorted(utils.get_files_with_extension(args.input, '.in')) if args.all else [args.input]
+    for input_file in input_files:
+        solve_from_file(input_file, args.output_directory, params=params, solve_function=race)
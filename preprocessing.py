@@ -0,0 +1,97 @@
+import numpy as np
+
+from formulation import graph_arcs, candidate_stops
+from shortest_paths import reconstruct_path
+
+# Largest relative difference between path lengths that still counts as a tie
+TOLERANCE = 1e-9
+
+
+def closure_weights(distances):
+    """
+    Metric closure of the given locations, without the arcs (a, b) that are as long as going through
+    a third location c at positive distance from both. The car can always drive a -> c -> b instead,
+    so every route keeps its cost over the remaining arcs.
+    """
+    n = len(distances)
+    redundant = np.zeros((n, n), dtype=bool)
+    for c in range(n):
+        through_c = distances[:, c, None] + distances[None, c, :]
+        is_between = (distances[:, c, None] > 0) & (distances[None, c, :] > 0)
+        redundant |= is_between & (through_c <= distances * (1 + TOLERANCE))
+    weights = np.where(redundant, np.inf, distances)
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+class ReducedInstance:
+    """
+    The instance restricted to the start and the locations where a TA may get dropped off. The car
+    drives between them along shortest paths of the original graph, so no other location needs to
+    be part of the model.
+        locations: original index of every location of the reduced instance
+        weights: lengths of the arcs kept between them, see closure_weights
+        home_indices, starting_car_index: in terms of the reduced instance, for the TAs left to place
+        fixed_homes: original indices of the homes of TAs that get off at the start in every optimal
+                     solution, since no location is closer to their home than the start
+    """
+
+    def __init__(self, weights, distances, home_indices, starting_car_index):
+        self.original_size = len(weights)
+        self.original_arcs = len(graph_arcs(weights))
+        self.original_stops = sum(len(stops) for stops in candidate_stops(distances, home_indices, starting_car_index))
+
+        stops = candidate_stops(distances, home_indices, starting_car_index)
+        self.fixed_homes = [home for home, ta_stops in zip(home_indices, stops) if len(ta_stops) == 1]
+        free = [(home, ta_stops) for home, ta_stops in zip(home_indices, stops) if len(ta_stops) > 1]
+
+        self.locations = sorted(set([starting_car_index] + [home for home, ta_stops in free] + [stop for home, ta_stops in free for stop in ta_stops]))
+        index = {location: i for i, location in enumerate(self.locations)}
+        self.home_indices = [index[home] for home, ta_stops in free]
+        self.starting_car_index = index[starting_car_index]
+        self.distances = distances[np.ix_(self.locations, self.locations)]
+        self.weights = closure_weights(self.distances)
+        self.fixed_walking_cost = float(distances[self.fixed_homes, starting_car_index].sum())
+
+    def summary(self, stops):
+        """
+        How much smaller the reduced instance is, given the candidate stops of its model.
+        """
+        reduced_stops = sum(len(ta_stops) for ta_stops in stops)
+        return (
+            f'Removed {self.original_size - len(self.locations)} of {self.original_size} locations, '
+            f'{self.original_arcs - len(graph_arcs(self.weights))} of {self.original_arcs} arcs, '
+            f'{self.original_stops - reduced_stops} of {self.original_stops} dropoff variables '
+            f'({len(self.fixed_homes)} TAs fixed at the start)'
+        )
+
+    def to_reduced(self, path, dropoffs):
+        """
+        Car path and dropoffs of the original instance in terms of the reduced one. Locations that
+        are not part of it are left out of the path and fixed TAs out of the dropoffs.
+        """
+        index = {location: i for i, location in enumerate(self.locations)}
+        reduced_path = []
+        for node in path:
+            if node in index and (not reduced_path or reduced_path[-1] != index[node]):
+                reduced_path.append(index[node])
+        fixed = set(self.fixed_homes)
+        reduced_dropoffs = {}
+        for stop, homes in dropoffs.items():
+            homes = [index[home] for home in homes if home not in fixed]
+            if homes and stop in index:
+                reduced_dropoffs[index[stop]] = homes
+        return reduced_path, reduced_dropoffs
+
+    def to_original(self, path, dropoffs, predecessors):
+        """
+        Car path and dropoffs of the reduced instance as a walk and dropoffs in the original graph.
+        """
+        original_path = [self.locations[path[0]]]
+        for u, v in zip(path[:-1], path[1:]):
+            original_path += reconstruct_path(predecessors, self.locations[u], self.locations[v])[1:]
+        original_dropoffs = {self.locations[stop]: [self.locations[home] for home in homes] for stop, homes in dropoffs.items()}
+        if self.fixed_homes:
+            start = self.locations[self.starting_car_index]
+            original_dropoffs.setdefault(start, []).extend(self.fixed_homes)
+        return original_path, original_dropoffs
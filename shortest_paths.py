@@ -0,0 +1,103 @@
+from collections import deque
+import numpy as np
+import networkx as nx
+
+NO_PREDECESSOR = -9999
+
+
+def adjacency_matrix_to_weights(adjacency_matrix):
+    """
+    Converts an adjacency matrix as returned by data_parser, or a float array with nan for 'x',
+    into a dense float array. Missing roads become inf and the diagonal is 0.
+    """
+    if isinstance(adjacency_matrix, np.ndarray):
+        weights = np.where(np.isnan(adjacency_matrix), np.inf, adjacency_matrix)
+    else:
+        weights = np.array([[np.inf if entry == 'x' else entry for entry in row] for row in adjacency_matrix], dtype=float)
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+def graph_to_weights(G):
+    """
+    Dense float weight array of a graph built by adjacency_matrix_to_graph, inf where there is no edge.
+    """
+    weights = nx.to_numpy_array(G, nodelist=range(G.number_of_nodes()), weight='weight', nonedge=np.inf)
+    np.fill_diagonal(weights, 0)
+    return weights
+
+
+def floyd_warshall(weights):
+    """
+    All-pairs shortest paths over a dense weight array (inf for missing edges).
+    Output:
+        dist: dist[i, j] is the length of a shortest path from i to j
+        pred: pred[i, j] is the node before j on a shortest path from i to j,
+              NO_PREDECESSOR if i == j or j is unreachable from i
+    """
+    dist = np.array(weights, dtype=float)
+    n = len(dist)
+    pred = np.where(np.isfinite(dist), np.arange(n)[:, None], NO_PREDECESSOR)
+    np.fill_diagonal(pred, NO_PREDECESSOR)
+
+    for k in range(n):
+        through_k = dist[:, k, None] + dist[None, k, :]
+        improved = through_k < dist
+        dist = np.where(improved, through_k, dist)
+        pred = np.where(improved, pred[k][None, :], pred)
+
+    return dist, pred
+
+
+def shortest_distances(weights):
+    """
+    The dist array of floyd_warshall, without tracking predecessors, for when only distances are needed.
+    """
+    dist = np.array(weights, dtype=float)
+    through_k = np.empty_like(dist)
+    for k in range(len(dist)):
+        np.add(dist[:, k, None], dist[None, k, :], out=through_k)
+        np.minimum(dist, through_k, out=dist)
+    return dist
+
+
+def reconstruct_path(pred, source, target):
+    """
+    List of nodes on the shortest path from source to target, both included.
+    """
+    path = [target]
+    while path[-1] != source:
+        previous = int(pred[source, path[-1]])
+        if previous == NO_PREDECESSOR:
+            raise ValueError(f'There is no path from {source} to {target}.')
+        path.append(previous)
+    return path[::-1]
+
+
+def fewest_marked_nodes_on_path(weights, source, marked):
+    """
+    For every node v, the smallest number of marked nodes on a path from source to v,
+    counting both ends. Computed with a 0-1 BFS, so this is O(n^2) on a dense weight array.
+    Nodes that are unreachable from source get 0.
+    """
+    n = len(weights)
+    is_marked = np.zeros(n, dtype=int)
+    is_marked[list(marked)] = 1
+    neighbors = [np.flatnonzero(np.isfinite(weights[u]) & (np.arange(n) != u)) for u in range(n)]
+
+    fewest = np.full(n, np.inf)
+    fewest[source] = is_marked[source]
+    queue = deque([source])
+    while queue:
+        u = queue.popleft()
+        for v in neighbors[u]:
+            count = fewest[u] + is_marked[v]
+            if count < fewest[v]:
+                fewest[v] = count
+                if is_marked[v]:
+                    queue.append(v)
+                else:
+                    queue.appendleft(v)
+
+    fewest[np.isinf(fewest)] = 0
+    return fewest.astype(int)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import utils
+from student_utils import cost_of_solution, parse_output
+from instance_cache import load_instance
+
+# Name of the store inside an output directory
+STORE_NAME = 'solutions.sqlite'
+
+OPTIMAL = 'optimal'
+FEASIBLE = 'feasible'
+
+# Relative difference between a cost and its lower bound within which the cost counts as optimal
+OPTIMALITY_TOLERANCE = 1e-9
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solutions (
+    input_file TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    cost REAL NOT NULL,
+    bound REAL,
+    status TEXT NOT NULL,
+    settings TEXT,
+    wall_time REAL,
+    solution TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (input_file, content_hash)
+)
+'''
+
+# Best known solution of every instance fingerprint (see Instance.fingerprint), in canonical positions
+CANONICAL_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS canonical_solutions (
+    fingerprint TEXT PRIMARY KEY,
+    input_file TEXT NOT NULL,
+    cost REAL NOT NULL,
+    bound REAL,
+    status TEXT NOT NULL,
+    settings TEXT,
+    solution TEXT NOT NULL,
+    updated REAL NOT NULL
+)
+'''
+
+
+def file_hash(file):
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def store_path(output_directory):
+    return os.path.join(output_directory, STORE_NAME)
+
+
+def reaches_bound(cost, bound):
+    """
+    Whether cost is within OPTIMALITY_TOLERANCE of the lower bound, which proves it optimal. False without a bound.
+    """
+    return bound is not None and cost <= bound + OPTIMALITY_TOLERANCE * max(1, abs(bound))
+
+
+def merge(existing, cost, bound, status):
+    """
+    Whether a solution should replace the existing record, which is not the case if that is cheaper,
+    or as cheap and optimal. Also returns the bound and status to store, keeping a higher bound of the
+    existing record and marking the solution optimal if its cost reaches it.
+    """
+    if existing is not None and (existing['cost'] < cost or (existing['cost'] == cost and existing['status'] == OPTIMAL)):
+        return False, bound, status
+    if existing is not None and existing['bound'] is not None and (bound is None or existing['bound'] > bound):
+        bound = existing['bound']
+        if reaches_bound(cost, bound):
+            status = OPTIMAL
+    return True, bound, status
+
+
+def canonical_solution(order, car_path, drop_offs):
+    """
+    A solution in terms of the canonical positions of its locations, where order[k] is the location at
+    position k, as JSON.
+    """
+    position = {location: k for k, location in enumerate(order)}
+    return json.dumps({
+        'path': [position[location] for location in car_path],
+        'dropoffs': [[position[stop]] + [position[home] for home in homes] for stop, homes in drop_offs.items()],
+    })
+
+
+def solution_from_canonical(order, solution):
+    """
+    The car path and dropoff mapping in terms of location indices of a solution from canonical_solution(),
+    for an instance whose locations are in the given canonical order.
+    """
+    solution = json.loads(solution)
+    car_path = [order[k] for k in solution['path']]
+    drop_offs = {order[dropoff[0]]: [order[k] for k in dropoff[1:]] for dropoff in solution['dropoffs']}
+    return car_path, drop_offs
+
+
+class SolutionStore:
+    """
+    Best known solution for every input file, keyed by the path of the input relative to the parent
+    of the output directory the store is in (see key()) and a hash of its contents, along with its cost, lower bound, status, solver settings and wall time. The best known solution
+    of every instance fingerprint is kept as well, so that relabeled copies of an instance can reuse it.
+    """
+
+    def __init__(self, path):
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(SCHEMA)
+        self.connection.execute(CANONICAL_SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def key(self, input_file):
+        """
+        The input file as the store records it, the same however the path to it is written.
+        """
+        return os.path.relpath(os.path.abspath(input_file), self.root)
+
+    def get(self, input_file, content_hash):
+        return self.connection.execute(
+            'SELECT * FROM solutions WHERE input_file = ? AND content_hash = ?',
+            (self.key(input_file), content_hash),
+        ).fetchone()
+
+    def records(self):
+        """
+        Every record, as a dictionary from (key(input file), content hash) to the row.
+        """
+        rows = self.connection.execute('SELECT * FROM solutions').fetchall()
+        return {(row['input_file'], row['content_hash']): row for row in rows}
+
+    def record(self, input_file, content_hash, cost, bound, status, solution, settings=None, wall_time=None):
+        """
+        Stores a solution unless the store already has one that is cheaper, or as cheap and optimal.
+        A higher lower bound that is already stored is kept, and the solution is marked optimal if its
+        cost reaches it. Returns whether the solution was stored.
+        """
+        with self.connection:
+            # take the write lock before reading, so that concurrent writers cannot compare against the same row
+            self.connection.execute('BEGIN IMMEDIATE')
+            better, bound, status = merge(self.get(input_file, content_hash), cost, bound, status)
+            if not better:
+                return False
+            self.connection.execute(
+                'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.key(input_file), content_hash, cost, bound, status, json.dumps(settings), wall_time, solution, time.time()),
+            )
+            return True
+
+    def get_canonical(self, fingerprint):
+        return self.connection.execute('SELECT * FROM canonical_solutions WHERE fingerprint = ?', (fingerprint,)).fetchone()
+
+    def record_canonical(self, fingerprint, input_file, cost, bound, status, solution, settings=None):
+        """
+        Stores a solution from canonical_solution() for the fingerprint of input_file, the same way
+        record() does. Returns whether the solution was stored.
+        """
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            better, bound, status = merge(self.get_canonical(fingerprint), cost, bound, status)
+            if not better:
+                return False
+            self.connection.execute(
+                'INSERT OR REPLACE INTO canonical_solutions VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (fingerprint, self.key(input_file), cost, bound, status, json.dumps(settings), solution, time.time()),
+            )
+            return True
+
+    def raise_bound(self, input_file, content_hash, bound):
+        """
+        Raises the lower bound of the stored solution to bound, if that is higher. The solution is marked
+        optimal if its cost reaches the bound. Returns whether the bound was raised.
+        """
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            existing = self.get(input_file, content_hash)
+            if existing is None or (existing['bound'] is not None and existing['bound'] >= bound):
+                return False
+            is_optimal = reaches_bound(existing['cost'], bound)
+            self.connection.execute(
+                'UPDATE solutions SET bound = ?, status = ? WHERE input_file = ? AND content_hash = ?',
+                (bound, OPTIMAL if is_optimal else existing['status'], existing['input_file'], content_hash),
+            )
+            return True
+
+    def export(self, output_directory, input_files=None):
+        """
+        Writes the .out file of every stored solution (or only those of input_files) to output_directory.
+        Where an input file has solutions for several versions of its contents, the latest one is written.
+        """
+        keys = None if input_files is None else set(map(self.key, input_files))
+        latest = {}
+        for row in self.records().values():
+            if keys is None or row['input_file'] in keys:
+                if row['input_file'] not in latest or latest[row['input_file']]['updated'] < row['updated']:
+                    latest[row['input_file']] = row
+        for key, row in latest.items():
+            utils.write_to_file_atomic(utils.input_to_output(key, output_directory), row['solution'])
+        return len(latest)
+
+
+def import_output(store, input_file, output_file):
+    """
+    Records an .out file and its .optimal sidecar, as written before the store existed. Without a
+    sidecar saying "True" the output is recorded as feasible only.
+    Returns whether the output was valid and got recorded.
+    """
+    optimal_tracker = output_file + '.optimal'
+    is_optimal = os.path.exists(optimal_tracker) and utils.read_file(optimal_tracker)[0][0] == 'True'
+
+    instance = load_instance(input_file)
+    try:
+        car_cycle, dropoffs = parse_output(utils.read_file(output_file), instance.names)
+    except (KeyError, IndexError, ValueError):
+        return False
+    cost, message = cost_of_solution(instance, car_cycle, dropoffs)
+    if cost == 'infinite':
+        return False
+
+    with open(output_file, 'r', encoding='utf-8') as f:
+        solution = f.read()
+    store.record(input_file, file_hash(input_file), cost, cost if is_optimal else None, OPTIMAL if is_optimal else FEASIBLE, solution)
+    return True
+
+
+def load_stored_solution(store, input_file, content_hash, output_file, names):
+    """
+    The stored solution of input_file, importing its .out file first if the store has none yet.
+    Returns the row and the solution as (car path, dropoffs) in terms of indices into names, or
+    (None, None) if there is no solution.
+    """
+    existing = store.get(input_file, content_hash)
+    if existing is None and os.path.exists(output_file):
+        import_output(store, input_file, output_file)
+        existing = store.get(input_file, content_hash)
+    if existing is None:
+        return None, None
+    return existing, parse_output([line.split() for line in existing['solution'].splitlines()], names)
+
+
+def import_outputs(store, input_directory, output_directory):
+    count = 0
+    for input_file in utils.get_files_with_extension(input_directory, '.in'):
+        output_file = utils.input_to_output(input_file, output_directory)
+        if os.path.exists(output_file):
+            if import_output(store, input_file, output_file):
+                count += 1
+            else:
+                print('Skipping invalid', output_file)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('command', choices=['import', 'export', 'status'], help='import existing .out/.optimal files, export .out files, or summarize the store')
+    parser.add_argument('output_directory', type=str, help='The output directory holding the store')
+    parser.add_argument('input_directory', type=str, nargs='?', help='The input directory, needed for import')
+    args = parser.parse_args()
+
+    store = SolutionStore(store_path(args.output_directory))
+    if args.command == 'import':
+        print('Imported', import_outputs(store, args.input_directory, args.output_directory), 'outputs')
+    elif args.command == 'export':
+        print('Exported', store.export(args.output_directory), 'outputs')
+    else:
+        records = store.records().values()
+        print(len(records), 'solutions,', sum(row['status'] == OPTIMAL for row in records), 'optimal')
+        for row in sorted(records, key=lambda row: row['input_file']):
+            gap = '' if row['bound'] is None or row['cost'] == 0 else f"{(row['cost'] - row['bound']) / row['cost']:.2%}"
+            print(row['input_file'], row['status'], row['cost'], gap)
+    store.close()
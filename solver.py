@@ -4,20 +4,68 @@ import os
 import sys
 sys.path.append('..')
 sys.path.append('../..')
+import time
+import json
 import argparse
 import utils
-import networkx as nx
-from mip import Model, xsum, minimize, BINARY, INTEGER, GUROBI, OptimizationStatus
-from itertools import product
+from functools import partial
+from multiprocessing import Pool
+from mip import OptimizationStatus, SearchEmphasis, CBC, GUROBI
+from instance import Instance
+from formulation import RouteModel, model_key
+from preprocessing import ReducedInstance
+from lower_bound import lower_bound
+from heuristic import solve_heuristic, solution_cost
+from instance_cache import load_input
+from solution_store import SolutionStore, store_path, file_hash, load_stored_solution, canonical_solution, solution_from_canonical, OPTIMAL, FEASIBLE, reaches_bound
+
+# Name of the instrumentation log inside an output directory
+LOG_NAME = 'solver_log.jsonl'
 
 from student_utils import *
+
+# Options that can be given in params as key=value, with their types and defaults
+SOLVER_OPTIONS = {
+    'threads': (int, 8),
+    'time': (float, 60 * 15),
+    'mode': (str, 'mip'),
+    'warm': (int, 1),
+    'formulation': (str, 'scf'),
+    'reduce': (int, 1),
+    'instrument': (int, 0),
+    'bound': (float, 0),
+    'model_cache': (str, ''),
+    'checkpoint': (float, 0),
+    'backend': (str, 'cbc'),
+    'emphasis': (int, 0),
+    'cut_level': (int, -1),
+}
+
+# python-mip solver of every backend option
+BACKENDS = {'cbc': CBC, 'gurobi': GUROBI}
+
+
+def parse_params(params):
+    """
+    Splits params into the solver options given as key=value and the remaining params.
+    """
+    options = {key: default for key, (option_type, default) in SOLVER_OPTIONS.items()}
+    rest = []
+    for param in params:
+        key, separator, value = param.partition('=')
+        if separator and key in SOLVER_OPTIONS:
+            options[key] = SOLVER_OPTIONS[key][0](value)
+        else:
+            rest.append(param)
+    return options, rest
+
 """
 ======================================================================
   Complete the following function.
 ======================================================================
 """
 
-def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, params=[]):
+def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, params=[], initial_solution=None, stats=None, on_incumbent=None, cutoff=None):
     """
     Write your algorithm here.
     Input:
@@ -25,161 +73,130 @@ def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_mat
         list_of_homes: A list of homes
         starting_car_location: The name of the starting location for the car
         adjacency_matrix: The adjacency matrix from the input file
+        initial_solution: Optionally a known (car path, dropoffs) in terms of indices to warm start the MIP from
+        stats: Optionally a dictionary that gets the cost and lower bound of the returned solution, and
+               the seconds spent in each phase of the solve under 'times'. With instrument=1 in params
+               it also gets the model size, the solver status and the incumbent and bound over time
+        on_incumbent: Optionally called with (car path, dropoffs, cost, lower bound) of the warm start,
+                      with no bound, and of every better solution the MIP finds. With checkpoint=seconds
+                      in params the MIP is solved in slices, the first of that many seconds, so that
+                      this happens while it runs
+        cutoff: Optionally a function returning the cost of the best solution known elsewhere, which
+                every slice of the MIP then only searches below
     Output:
         A list of locations representing the car path
         A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
         NOTE: both outputs should be in terms of indices not the names of the locations themselves
     """
 
-    location_name_to_index = {}
-    for i in range(0, len(list_of_locations)):
-        location_name_to_index[list_of_locations[i]] = i
-
-    tas = range(0, len(list_of_homes))
-    nTas = len(tas)
-    home_indices = list(map(lambda home: location_name_to_index[home], list_of_homes))
-
-    starting_car_index = location_name_to_index[starting_car_location]
-
-    (G, message) = adjacency_matrix_to_graph(adjacency_matrix)
-    shortest_paths = nx.floyd_warshall(G)
-    #shortest_paths_uw = nx.floyd_warshall(G, weight=None)
-    L = range(0, len(list_of_locations))
-    nL = len(L)
-
-    model = Model()
-    model.threads = 8
-
-    edge_taken = [[model.add_var(var_type=BINARY) for j in L] for i in L]
-    drop_ta_at_stop = [[model.add_var(var_type=BINARY) for stop in L] for ta in tas]
-
-    driving_cost = (2 / 3) * xsum(
-        G.edges[i, j]["weight"] * edge_taken[i][j]
-        for i in L for j in L if G.has_edge(i, j)
-    )
-
-    walking_cost = xsum(
-        shortest_paths[home_indices[ta]][stop] * drop_ta_at_stop[ta][stop]
-        for stop in L for ta in tas
-    )
-
-    model.objective = minimize(driving_cost + walking_cost)
-
-    # only take edges that exist
-    for i in L:
-        for j in L:
-            if not G.has_edge(i, j):
-                model += edge_taken[i][j] == 0
-
-    # enter city same number of times as we exist the city
-    for i in L:
-        model += xsum(edge_taken[incoming][i] for incoming in L) == xsum(edge_taken[i][to] for to in L)
-
-    # every TA is dropped off at exactly one stop
-    for ta in tas:
-        model += xsum(drop_ta_at_stop[ta][stop] for stop in L) == 1
-
-    if False: # MCF formulation
-        ta_over_edge = [[[model.add_var(var_type=BINARY) for ta in tas] for j in L] for i in L]
-        
-        # each TA gets dropped off at their stop
-        for node in (set(L) - {starting_car_index}):
-            for ta in tas:
-                ta_entering_node = xsum(
-                    ta_over_edge[prev][node][ta]
-                    for prev in L
-                )
-
-                ta_leaving_node = xsum(
-                    ta_over_edge[node][nxt][ta]
-                    for nxt in L
-                )
-
-                ta_dropped_at_stop = drop_ta_at_stop[ta][node]
-
-                model += ta_entering_node == ta_leaving_node + ta_dropped_at_stop
-
-        # each TA must be dropped off somewhere along the route
-        for ta in tas:
-            leaving_start = xsum(ta_over_edge[starting_car_index][nxt][ta] for nxt in L)
-            returning_start = xsum(ta_over_edge[prev][starting_car_index][ta] for prev in L)
-            model += leaving_start == 1 - drop_ta_at_stop[ta][starting_car_index] # drop TA off right before we leave
-            model += returning_start == 0
-
-        # if a TA goes over an edge, we must take it as well
-        for i in L:
-            for j in L:
-                for ta in tas:
-                    model += edge_taken[i][j] >= ta_over_edge[i][j][ta]
-    else: # SCF formulation
-        flow_over_edge = [[model.add_var(var_type=INTEGER) for j in L] for i in L]
-
-        # flow decreases only when TAs are dropped off
-        for node in (set(L) - {starting_car_index}):
-            tas_entering_node = xsum(
-                flow_over_edge[prev][node]
-                for prev in L
-            )
-
-            tas_leaving_node = xsum(
-                flow_over_edge[node][nxt]
-                for nxt in L
-            )
-
-            tas_dropped_at_stop = xsum(drop_ta_at_stop[ta][node] for ta in tas)
-
-            model += tas_entering_node == tas_leaving_node + tas_dropped_at_stop
-
-        # each TA must be dropped off somewhere along the route
-        leaving_start = xsum(flow_over_edge[starting_car_index][nxt] for nxt in L)
-        returning_start = xsum(flow_over_edge[prev][starting_car_index] for prev in L)
-        model += leaving_start == nTas - xsum(drop_ta_at_stop[ta][starting_car_index] for ta in tas)
-        model += returning_start == 0
-
-        # if flow goes over an edge, we must take it as well
-        for i in L:
-            for j in L:
-                shortest_paths = nx.all_simple_paths(G,starting_car_index,i)
-                r_vals = []
-                for path in shortest_paths:
-                    r_val = 0
-                    for node in path:
-                        if node in home_indices:
-                            r_val+=1
-                    r_vals.append(r_val)
-                model += edge_taken[i][j] * (nTas - min(r_vals)) >= flow_over_edge[i][j]
-
-    print(model.constrs)
-    status = model.optimize(max_seconds=60*15)
-    if model.num_solutions > 0:
-        edge_graph = nx.DiGraph()
-        print("Edges taken:")
-        count = 0
-        for i in range(0, nL):
-            for j in range(0, nL):
-                if (edge_taken[i][j].x >= 0.99):
-                    edge_graph.add_edge(i, j)
-                    print(i, j, G.edges[i, j]["weight"])
-                    count += 1
-        
-        if count == 0:
-            print("Path is empty")
-            path = [starting_car_index]
-        else:
-            print("Path:")
-            path = [u for u, v in nx.eulerian_circuit(edge_graph, source=starting_car_index)] + [starting_car_index]
-            for node in path:
-                print(node)
-
-        dropoffs = {}
-        for ta in tas:
-            drop_off_stop = [i for i in L if drop_ta_at_stop[ta][i].x >= 0.99][0]
-            if not drop_off_stop in dropoffs:
-                dropoffs[drop_off_stop] = []
-            dropoffs[drop_off_stop].append(home_indices[ta])
-        return (path, dropoffs, status == OptimizationStatus.OPTIMAL)
-
-    return None
+    options, _ = parse_params(params)
+    stats = stats if stats is not None else {}
+    times = stats['times'] = {}
+    phase_start = time.perf_counter()
+
+    instance = Instance(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
+    home_indices, starting_car_index, weights = instance.home_indices, instance.starting_car_index, instance.weights
+    distances, predecessors = instance.shortest_paths()
+    times['apsp'] = time.perf_counter() - phase_start
+
+    if options['mode'] == 'heuristic':
+        phase_start = time.perf_counter()
+        path, dropoffs = solve_heuristic(distances, predecessors, home_indices, starting_car_index)
+        times['heuristic'] = time.perf_counter() - phase_start
+        stats['cost'] = solution_cost(weights, distances, path, dropoffs)
+        stats['bound'] = None
+        if options['bound'] > 0:
+            # bound=seconds gets the heuristic solution an LP lower bound, which may prove it optimal
+            phase_start = time.perf_counter()
+            stats['bound'] = lower_bound(weights, distances, home_indices, starting_car_index, options['bound'])
+            times['bound'] = time.perf_counter() - phase_start
+        is_optimal = reaches_bound(stats['cost'], stats['bound'])
+        return (path, dropoffs, is_optimal)
+
+    phase_start = time.perf_counter()
+    reduced = None
+    if options['reduce']:
+        reduced = ReducedInstance(weights, distances, home_indices, starting_car_index)
+        if not reduced.home_indices:
+            path, dropoffs = reduced.to_original([reduced.starting_car_index], {}, predecessors)
+            stats['cost'] = stats['bound'] = solution_cost(weights, distances, path, dropoffs)
+            return (path, dropoffs, True)
+        model_data = (reduced.weights, reduced.distances, reduced.home_indices, reduced.starting_car_index)
+    else:
+        model_data = (weights, distances, home_indices, starting_car_index)
+    model_file = None
+    if options['model_cache']:
+        # model_cache=directory reads the model from a file written on the first solve of the instance
+        os.makedirs(options['model_cache'], exist_ok=True)
+        model_file = os.path.join(options['model_cache'], model_key(*model_data, options['formulation']) + '.lp.gz')
+    route_model = RouteModel(*model_data, formulation=options['formulation'], model_file=model_file, solver_name=BACKENDS[options['backend']])
+    if reduced:
+        stats['reduction'] = reduced.summary(route_model.stops)
+    model = route_model.model
+    model.threads = options['threads']
+    model.emphasis = SearchEmphasis(options['emphasis'])
+    model.cuts = options['cut_level']
+    times['build'] = time.perf_counter() - phase_start
+
+    warm_solution = None
+    if options['warm']:
+        phase_start = time.perf_counter()
+        # start from the cheaper of the given solution and a quick heuristic one
+        candidates = [solve_heuristic(distances, predecessors, home_indices, starting_car_index)]
+        if initial_solution is not None:
+            candidates.append(initial_solution)
+        warm_solution = min(candidates, key=lambda solution: solution_cost(weights, distances, *solution))
+        model.start = route_model.start_values(*(reduced.to_reduced(*warm_solution) if reduced else warm_solution))
+        times['heuristic'] = time.perf_counter() - phase_start
+        if on_incumbent is not None:
+            on_incumbent(*warm_solution, solution_cost(weights, distances, *warm_solution), None)
+
+    if options['instrument']:
+        stats['model'] = {'columns': model.num_cols, 'rows': model.num_rows, 'nonzeros': model.num_nz, 'integers': model.num_int}
+
+    on_solution = None
+    if on_incumbent is not None:
+        def on_solution(path, dropoffs, bound):
+            if reduced:
+                path, dropoffs = reduced.to_original(path, dropoffs, predecessors)
+                if bound is not None:
+                    bound += reduced.fixed_walking_cost
+            on_incumbent(path, dropoffs, solution_cost(weights, distances, path, dropoffs), bound)
+
+    model_cutoff = None
+    if cutoff is not None:
+        offset = reduced.fixed_walking_cost if reduced else 0
+        model_cutoff = lambda: cutoff() - offset
+
+    phase_start = time.perf_counter()
+    status = route_model.optimize(options['time'], slice_seconds=options['checkpoint'] or None, on_solution=on_solution, cutoff=model_cutoff)
+    times['optimize'] = time.perf_counter() - phase_start
+    stats['status'] = status.name
+    if options['instrument']:
+        # (seconds, lower bound, objective value) after every solve of the model, from the warm start on
+        offset = reduced.fixed_walking_cost if reduced else 0
+        stats['progress'] = [(seconds, bound + offset, None if objective is None else objective + offset) for seconds, bound, objective in route_model.progress]
+        if warm_solution is not None:
+            stats['progress'] = [(0.0, None, solution_cost(weights, distances, *warm_solution))] + stats['progress']
+
+    phase_start = time.perf_counter()
+    stats['bound'] = route_model.bound
+    if reduced and stats['bound'] is not None:
+        stats['bound'] += reduced.fixed_walking_cost
+    candidates = []
+    if route_model.incumbent is not None:
+        path, dropoffs = route_model.incumbent
+        candidates.append(reduced.to_original(path, dropoffs, predecessors) if reduced else (path, dropoffs))
+    if warm_solution is not None:
+        # the cuts formulation can run out of time on a route that is not connected yet, and is then
+        # left with the repair of it, which may cost more than the warm start
+        candidates.append(warm_solution)
+    if not candidates:
+        return None
+    path, dropoffs = min(candidates, key=lambda solution: solution_cost(weights, distances, *solution))
+    stats['cost'] = solution_cost(weights, distances, path, dropoffs)
+    times['extract'] = time.perf_counter() - phase_start
+    return (path, dropoffs, status == OptimizationStatus.OPTIMAL or reaches_bound(stats['cost'], stats['bound']))
 
 
 """
@@ -190,9 +207,9 @@ def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_mat
 
 """
 Convert solution with path and dropoff_mapping in terms of indices
-and write solution output in terms of names to path_to_file + file_number + '.out'
+into the contents of an output file in terms of names
 """
-def convertToFile(path, dropoff_mapping, path_to_file, list_locs):
+def solution_to_string(path, dropoff_mapping, list_locs):
     string = ''
     for node in path:
         string += list_locs[node] + ' '
@@ -208,54 +225,180 @@ def convertToFile(path, dropoff_mapping, path_to_file, list_locs):
         strDrop = strDrop.strip()
         strDrop += '\n'
         string += strDrop
-    utils.write_to_file(path_to_file, string)
+    return string
+
+"""
+Convert solution with path and dropoff_mapping in terms of indices
+and write solution output in terms of names to path_to_file + file_number + '.out'
+"""
+def convertToFile(path, dropoff_mapping, path_to_file, list_locs):
+    utils.write_to_file_atomic(path_to_file, solution_to_string(path, dropoff_mapping, list_locs))
+
+def write_log(log_file, record):
+    """
+    Appends record to log_file as one JSON line, in a single write so that the lines of processes
+    solving in parallel do not interleave.
+    """
+    fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, (json.dumps(record) + '\n').encode('utf-8'))
+    finally:
+        os.close(fd)
 
-def solve_from_file(input_file, output_directory, params=[]):
+def solve_from_file(input_file, output_directory, params=[], solve_function=solve):
+    """
+    Solves input_file unless the solution store of output_directory already has an optimal solution
+    for its contents, records the solution in the store and writes its .out file if it is the best so far.
+    A stored solution of an equivalent instance, with the same fingerprint, is used as well, and the
+    solve is skipped if that solution is optimal or came from a solve with the same settings.
+    With instrument=1 in params, the solve's stats are appended to the log in output_directory.
+    solve_function is called in place of solve(), with the same arguments.
+    """
     print('Processing', input_file)
 
-    basename, filename = os.path.split(input_file)
-    if not os.path.exists(output_directory):
-        os.makedirs(output_directory)
+    os.makedirs(output_directory, exist_ok=True)
     output_file = utils.input_to_output(input_file, output_directory)
-    optimal_tracker = output_file + ".optimal"
+    store = SolutionStore(store_path(output_directory))
+    content_hash = file_hash(input_file)
 
-    existing_optimal = ((not os.path.exists(optimal_tracker)) or (utils.read_file(optimal_tracker)[0][0] == "True"))
-    if os.path.exists(output_file) and existing_optimal:
-        if not os.path.exists(optimal_tracker):
-            utils.write_to_file(output_file + ".optimal", str(True))
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = load_input(input_file)
+    existing, initial_solution = load_stored_solution(store, input_file, content_hash, output_file, list_locations)
+    if existing is not None and existing['status'] == OPTIMAL:
         print("Skipping, already solved optimal")
-    elif os.path.exists(output_file) and False:
-        print("Skipping non-optimal")
+        store.close()
+        return
+
+    instance = Instance(list_locations, list_houses, starting_car_location, adjacency_matrix)
+    fingerprint, order = instance.fingerprint()
+    options, _ = parse_params(params)
+    start_time = time.time()
+
+    def keep(car_path, drop_offs, cost, bound, status, settings):
+        solution = solution_to_string(car_path, drop_offs, list_locations)
+        store.record_canonical(fingerprint, input_file, cost, bound, status, canonical_solution(order, car_path, drop_offs), settings=settings)
+        if store.record(input_file, content_hash, cost, bound, status, solution, settings=settings, wall_time=time.time() - start_time):
+            utils.write_to_file_atomic(output_file, solution)
+
+    if existing is not None:
+        store.record_canonical(fingerprint, input_file, existing['cost'], existing['bound'], existing['status'],
+                               canonical_solution(order, *initial_solution), settings=json.loads(existing['settings']))
+
+    equivalent = store.get_canonical(fingerprint)
+    if equivalent is not None and equivalent['input_file'] != store.key(input_file):
+        car_path, drop_offs = solution_from_canonical(order, equivalent['solution'])
+        cost, message = cost_of_solution(instance, car_path, drop_offs)
+        settings = json.loads(equivalent['settings'])
+        if cost != 'infinite':
+            keep(car_path, drop_offs, cost, equivalent['bound'], equivalent['status'], settings)
+            initial_solution = (car_path, drop_offs)
+            if equivalent['status'] == OPTIMAL or settings == options:
+                print('Reusing the solution of', equivalent['input_file'])
+                store.close()
+                return
+
+    stats = {}
+    checkpoint = None
+    if options['checkpoint']:
+        # keep every better solution the MIP finds, in case this process does not get to finish
+        def checkpoint(car_path, drop_offs, cost, bound):
+            keep(car_path, drop_offs, cost, bound, FEASIBLE, options)
+    sol = solve_function(list_locations, list_houses, starting_car_location, adjacency_matrix, params=params, initial_solution=initial_solution, stats=stats, on_incumbent=checkpoint)
+    wall_time = time.time() - start_time
+    if sol:
+        car_path, drop_offs, is_optimal = sol
+        keep(car_path, drop_offs, stats['cost'], stats['bound'], OPTIMAL if is_optimal else FEASIBLE, options)
     else:
-        input_data = utils.read_file(input_file)
-        num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
-        sol = solve(list_locations, list_houses, starting_car_location, adjacency_matrix, params=params)
-        if sol:
-            car_path, drop_offs, is_optimal = sol
-            convertToFile(car_path, drop_offs, output_file, list_locations)
-            utils.write_to_file(output_file + ".optimal", str(is_optimal))
-        else:
-            print("no feasible solution")
+        print("no feasible solution")
+    if options['instrument']:
+        record = {'input_file': input_file, 'content_hash': content_hash, 'fingerprint': fingerprint, 'settings': options, 'wall_time': wall_time, 'optimal': bool(sol) and sol[2]}
+        record.update(stats)
+        write_log(os.path.join(output_directory, LOG_NAME), record)
+    store.close()
 
 
-def solve_all(input_directory, output_directory, params=[]):
-    input_files = utils.get_files_with_extension(input_directory, (params[0] if len(params) > 0 else '') + '.in')
+def input_size(input_file):
+    with open(input_file, 'r', encoding='utf-8') as f:
+        try:
+            return int(f.readline().split()[0])
+        except (ValueError, IndexError):
+            return 0
 
-    for input_file in input_files:
-        solve_from_file(input_file, output_directory, params=params)
+
+def input_fingerprint(input_file):
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = load_input(input_file)
+    return Instance(list_locations, list_houses, starting_car_location, adjacency_matrix).fingerprint()[0]
+
+
+def solve_all(input_directory, output_directory, params=[], jobs=1, threads=None, time_limit=None):
+    """
+    Solves every input file in input_directory. With jobs > 1 the files are solved in a pool of that
+    many processes, largest instances first, and the thread budget is split between the processes.
+    Files that the solution store already has an optimal solution for are skipped up front. With jobs > 1,
+    of the files with the same fingerprint one is solved first and the others after it, so that they
+    can reuse its solution.
+    """
+    options, rest = parse_params(params)
+    input_files = utils.get_files_with_extension(input_directory, (rest[0] if len(rest) > 0 else '') + '.in')
+
+    os.makedirs(output_directory, exist_ok=True)
+    store = SolutionStore(store_path(output_directory))
+    optimal = set(key for key, row in store.records().items() if row['status'] == OPTIMAL)
+    input_files = [input_file for input_file in input_files if (store.key(input_file), file_hash(input_file)) not in optimal]
+    store.close()
+    print(len(input_files), 'input files left to solve')
+
+    threads = threads if threads is not None else options['threads']
+    params = params + [f'threads={max(1, threads // jobs)}']
+    if time_limit is not None:
+        params.append(f'time={time_limit}')
+
+    if jobs == 1:
+        # duplicates solved later in turn reuse the solution of the first one
+        for input_file in input_files:
+            solve_from_file(input_file, output_directory, params=params)
+        return
+
+    with Pool(jobs) as pool:
+        fingerprints = pool.map(input_fingerprint, input_files)
+    groups = {}
+    for input_file, fingerprint in zip(input_files, fingerprints):
+        groups.setdefault(fingerprint, []).append(input_file)
+    batches = [[group[0] for group in groups.values()], [input_file for group in groups.values() for input_file in group[1:]]]
+    for batch in batches:
+        batch.sort(key=input_size, reverse=True)
+        with Pool(jobs, maxtasksperchild=1) as pool:
+            for _ in pool.imap_unordered(partial(solve_from_file, output_directory=output_directory, params=params), batch):
+                pass
 
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the solver is run on all files in the input directory. Else, it is run on just the given input file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of input files to solve in parallel when --all is given')
+    parser.add_argument('--threads', type=int, default=None, help='Total number of solver threads, split between the jobs')
+    parser.add_argument('--time-limit', type=float, default=None, help='Time budget in seconds for each input file')
+    parser.add_argument('--instrument', action='store_true', help=f'Append phase times, model sizes and solver progress of every solve to {LOG_NAME} in the output directory')
+    parser.add_argument('--model-cache', type=str, default=None, help='Directory to cache the model of every input file in, keyed by its content and formulation')
+    parser.add_argument('--checkpoint', type=float, default=None, help='Solve the MIP in time slices that start at this many seconds, and store every better solution as soon as it is found')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('output_directory', type=str, nargs='?', default='.', help='The path to the directory where the output should be written')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
     output_directory = args.output_directory
+    if args.instrument:
+        args.params = args.params + ['instrument=1']
+    if args.model_cache:
+        args.params = args.params + [f'model_cache={args.model_cache}']
+    if args.checkpoint:
+        args.params = args.params + [f'checkpoint={args.checkpoint}']
     if args.all:
         input_directory = args.input
-        solve_all(input_directory, output_directory, params=args.params)
+        solve_all(input_directory, output_directory, params=args.params, jobs=args.jobs, threads=args.threads, time_limit=args.time_limit)
     else:
         input_file = args.input
-        solve_from_file(input_file, output_directory, params=args.params)
+        params = args.params
+        if args.threads is not None:
+            params = params + [f'threads={args.threads}']
+        if args.time_limit is not None:
+            params = params + [f'time={args.time_limit}']
+        solve_from_file(input_file, output_directory, params=params)
@@ -1,5 +1,7 @@
 import networkx as nx
 import numpy as np
+from shortest_paths import graph_to_weights, shortest_distances
+from instance import Instance
 
 
 def decimal_digits_check(number):
@@ -11,6 +13,19 @@ def decimal_digits_check(number):
         return len(parts[1]) <= 5
 
 
+def decimal_digits_check_array(numbers):
+    """
+    decimal_digits_check of every number of a float array at once: whether it has at most 5 decimal digits.
+    Numbers that fail are checked again by decimal_digits_check, which accepts those that str() writes in
+    scientific notation without a '.', such as 0.000001.
+    """
+    numbers = np.asarray(numbers, dtype=float)
+    result = np.round(numbers, 5) == numbers
+    for index in zip(*np.nonzero(~result)):
+        result[index] = decimal_digits_check(numbers[index])
+    return result
+
+
 def data_parser(input_data):
     number_of_locations = int(input_data[0][0])
     number_of_houses = int(input_data[1][0])
@@ -22,31 +37,45 @@ def data_parser(input_data):
     return number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix
 
 
-def adjacency_matrix_to_graph(adjacency_matrix):
-    node_weights = [adjacency_matrix[i][i] for i in range(len(adjacency_matrix))]
-    adjacency_matrix_formatted = [[0 if entry == 'x' else entry for entry in row] for row in adjacency_matrix]
+def adjacency_matrix_to_array(adjacency_matrix):
+    """
+    Float array of an adjacency matrix with nan for 'x'. Arrays are returned as they are.
+    Raises ValueError if the matrix is not rectangular.
+    """
+    if isinstance(adjacency_matrix, np.ndarray):
+        return adjacency_matrix
+    return np.array([[np.nan if entry == 'x' else entry for entry in row] for row in adjacency_matrix], dtype=float)
 
-    for i in range(len(adjacency_matrix_formatted)):
-        adjacency_matrix_formatted[i][i] = 0
 
-    G = nx.convert_matrix.from_numpy_matrix(np.matrix(adjacency_matrix_formatted))
+def adjacency_matrix_to_graph(adjacency_matrix):
+    adjacency_matrix = adjacency_matrix_to_array(adjacency_matrix)
+    node_weights = np.diag(adjacency_matrix)
+    adjacency_matrix_formatted = np.where(np.isnan(adjacency_matrix), 0, adjacency_matrix)
+    np.fill_diagonal(adjacency_matrix_formatted, 0)
 
-    message = ''
+    G = nx.convert_matrix.from_numpy_matrix(np.matrix(adjacency_matrix_formatted))
 
     for node, datadict in G.nodes.items():
-        if node_weights[node] != 'x':
-            message += 'The location {} has a road to itself. This is not allowed.\n'.format(node)
-        datadict['weight'] = node_weights[node]
+        datadict['weight'] = 'x' if np.isnan(node_weights[node]) else float(node_weights[node])
 
-    return G, message
+    return G, self_loop_message(adjacency_matrix)
+
+
+def self_loop_message(adjacency_matrix):
+    message = ''
+    for node in np.flatnonzero(~np.isnan(np.diag(adjacency_matrix))):
+        message += 'The location {} has a road to itself. This is not allowed.\n'.format(node)
+    return message
 
 
 def is_metric(G):
-    shortest = dict(nx.floyd_warshall(G))
-    for u, v, datadict in G.edges(data=True):
-        if abs(shortest[u][v] - datadict['weight']) >= 0.00001:
-            return False
-    return True
+    weights = graph_to_weights(G)
+    return weights_are_metric(weights, shortest_distances(weights))
+
+
+def weights_are_metric(weights, shortest):
+    edges = np.isfinite(weights)
+    return bool(np.all(np.abs(shortest[edges] - weights[edges]) < 0.00001))
 
 
 def adjacency_matrix_to_edge_list(adjacency_matrix):
@@ -59,25 +88,46 @@ def adjacency_matrix_to_edge_list(adjacency_matrix):
 
 
 def is_valid_walk(G, closed_walk):
+    if isinstance(G, Instance):
+        return is_valid_walk_in_weights(G.weights, closed_walk)
     if len(closed_walk) == 2:
         return closed_walk[0] == closed_walk[1]
     return all([(closed_walk[i], closed_walk[i+1]) in G.edges for i in range(len(closed_walk) - 1)])
 
 
+def is_valid_walk_in_weights(weights, closed_walk):
+    if None in closed_walk:
+        return False
+    if len(closed_walk) == 2:
+        return closed_walk[0] == closed_walk[1]
+    u, v = np.array(closed_walk[:-1], dtype=int), np.array(closed_walk[1:], dtype=int)
+    return bool(np.all((u != v) & np.isfinite(weights[u, v])))
+
+
 def get_edges_from_path(path):
     return [(path[i], path[i+1]) for i in range(len(path) - 1)]
 
 """
-G is the adjacency matrix.
+G is the graph, or an Instance.
 car_cycle is the cycle of the car in terms of indices.
 dropoff_mapping is a dictionary of dropoff location to list of TAs that got off at said droppoff location
 in terms of indices.
 """
 def cost_of_solution(G, car_cycle, dropoff_mapping):
+    if isinstance(G, Instance):
+        return cost_of_solution_in_weights(G.weights, G.shortest_paths()[0], car_cycle, dropoff_mapping)
+    weights = graph_to_weights(G)
+    return cost_of_solution_in_weights(weights, shortest_distances(weights), car_cycle, dropoff_mapping)
+
+"""
+Same as cost_of_solution, for a dense weight array (inf where there is no road) and its shortest
+path distances, so that callers can compute the distances once per instance.
+"""
+def cost_of_solution_in_weights(weights, shortest, car_cycle, dropoff_mapping):
     cost = 0
     message = ''
     dropoffs = dropoff_mapping.keys()
-    if not is_valid_walk(G, car_cycle):
+    if not is_valid_walk_in_weights(weights, car_cycle):
         message += 'This is not a valid walk for the given graph.\n'
         cost = 'infinite'
 
@@ -85,20 +135,13 @@ def cost_of_solution(G, car_cycle, dropoff_mapping):
         message += 'The start and end vertices are not the same.\n'
         cost = 'infinite'
     if cost != 'infinite':
-        if len(car_cycle) == 1:
-            car_cycle = []
-        else:
-            car_cycle = get_edges_from_path(car_cycle[:-1]) + [(car_cycle[-2], car_cycle[-1])]
-        if len(car_cycle) != 1:
-            driving_cost = sum([G.edges[e]['weight'] for e in car_cycle]) * 2 / 3
+        if len(car_cycle) - 1 != 1:
+            driving_cost = sum(weights[car_cycle[:-1], car_cycle[1:]].tolist()) * 2 / 3
         else:
             driving_cost = 0
-        walking_cost = 0
-        shortest = dict(nx.floyd_warshall(G))
-
-        for drop_location in dropoffs:
-            for house in dropoff_mapping[drop_location]:
-                walking_cost += shortest[drop_location][house]
+        drop_locations = [drop_location for drop_location in dropoffs for house in dropoff_mapping[drop_location]]
+        houses = [house for drop_location in dropoffs for house in dropoff_mapping[drop_location]]
+        walking_cost = sum(shortest[drop_locations, houses].tolist())
 
         message += f'The driving cost of your solution is {driving_cost}.\n'
         message += f'The walking cost of your solution is {walking_cost}.\n'
@@ -108,5 +151,28 @@ def cost_of_solution(G, car_cycle, dropoff_mapping):
     return cost, message
 
 
+def parse_output(output_data, list_of_locations):
+    """
+    Car cycle and dropoff mapping in terms of indices from the lines of an output file.
+    """
+    location_name_to_index = location_indices(list_of_locations)
+    car_cycle = [location_name_to_index[name] for name in output_data[0]]
+    dropoffs = {}
+    for dropoff in output_data[2:2 + int(output_data[1][0])]:
+        dropoffs[location_name_to_index[dropoff[0]]] = [location_name_to_index[name] for name in dropoff[1:]]
+    return car_cycle, dropoffs
+
+
+def location_indices(list_of_locations):
+    """
+    Dictionary from location name to the index of its first occurrence in list_of_locations.
+    """
+    location_name_to_index = {}
+    for i, name in enumerate(list_of_locations):
+        location_name_to_index.setdefault(name, i)
+    return location_name_to_index
+
+
 def convert_locations_to_indices(list_to_convert, list_of_locations):
-    return [list_of_locations.index(name) if name in list_of_locations else None for name in list_to_convert]
+    location_name_to_index = location_indices(list_of_locations)
+    return [location_name_to_index.get(name) for name in list_to_convert]
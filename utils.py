@@ -24,6 +24,17 @@ def write_to_file(file, string, append=False):
         f.write(string)
 
 
+def write_to_file_atomic(file, string):
+    """
+    Writes string to file through a temporary file in the same directory, so that readers (and
+    processes that are killed mid-write) never see a partially written file.
+    """
+    temporary_file = f'{file}.{os.getpid()}.tmp'
+    with open(temporary_file, 'w', encoding='utf-8') as f:
+        f.write(string)
+    os.replace(temporary_file, file)
+
+
 def write_data_to_file(file, data, separator, append=False):
     if append:
         mode = 'a'